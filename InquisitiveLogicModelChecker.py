@@ -24,87 +24,293 @@
 # Author
 # Korijn Moor
 
-import pickle
 import json
+import sys
 from collections import defaultdict
 import func as fn
 import re
-from copy import deepcopy
+
+
+# separators between the atomic propositions given to add_world
+VALUATION_SEPARATORS = re.compile(r"[,;:\s]+")
+
+# cell values that are read as true from csv truth tables
+TRUE_CELLS = {"1", "true", "t", "yes", "y"}
+
+# number of updates a version can be rolled back
+HISTORY_LIMIT = 100
+
+def intern(name):
+    """Interns (string) names of worlds and atoms, so that comparing and hashing them is cheap"""
+    return sys.intern(name) if type(name) == str else name
+
 
 class Model:
-    
+    """
+        Inquisitive logic model: a set of worlds, a valuation, a context and named information states.
+
+        Note: every world gets a fixed bit index, so information states can also be represented as bitmasks.
+            The context is stored as an antichain of bitmasks (its alternatives), the downward closed set of
+            information states (model.context) is only computed when it is accessed and then cached.
+            Valuations should be changed with add_world/remove_world so the world-to-atoms index stays correct.
+
+            Versions: fork and update return new versions of the model that share the world tables, valuations and
+                information states with this one (copy on write, the first change of a shared table copies it) and the
+                alternatives of the context (which are never changed in place). rollback returns the version a version
+                was forked from (up to HISTORY_LIMIT versions back), so exploring branches of updates does not copy the model.
+                Earlier versions are never changed by later ones, a version stays in memory as long as a later version
+                refers to it. Pickling a version leaves out its earlier versions and its observers.
+
+            Observers: functions registered with observe are called with the components that a change touched,
+                ("atom", atom), ("worlds",), ("context",) or ("state", name), see incremental.py.
+    """
+    __slots__ = ("worlds", "valuation", "information_states",
+                 "_world_index", "_world_names", "_free_bits", "_world_atoms", "_alternatives", "_context",
+                 "_parent", "_depth", "_shared", "_observers")
+
     def __init__(self, *args, **kwargs):
-        self.worlds = kwargs.get("worlds", set())
+        self.worlds = set()
+        self.valuation = defaultdict(set)
+        self.information_states = dict(kwargs.get("information_states", dict()))
+
+        self._world_index = dict()  # world -> bit index
+        self._world_names = list()  # bit index -> world (None for bits of removed worlds)
+        self._free_bits = list()
+        self._world_atoms = dict()  # world -> atoms that are true in that world
+        self._alternatives = list()
+        self._context = None
+        self._parent = None
+        self._depth = 0     # number of versions this version can be rolled back
+        self._shared = False
+        self._observers = list()
+
+        for w in kwargs.get("worlds", set()):
+            self.add_world(w)
+        for atom, worlds in kwargs.get("valuation", dict()).items():
+            atom = intern(atom)
+            self.valuation[atom] = set()
+            for w in worlds:
+                self.set_atom(w, atom)
         self.context = kwargs.get("context", set())
-        self.valuation = kwargs.get("valuation", defaultdict(set))
-        self.information_states = kwargs.get("information_states", dict())
+
+    def fork(self):
+        """Returns a new version of the model in constant time, later changes to either of them do not affect the other"""
+        version = object.__new__(type(self))
+        for slot in Model.__slots__:
+            setattr(version, slot, getattr(self, slot))
+        version._parent = self
+        version._depth = self._depth + 1
+        version._shared = self._shared = True
+        version._observers = list()
+        return version
+
+    def __getstate__(self):
+        state = dict([(slot, getattr(self, slot)) for slot in Model.__slots__])
+        state["_parent"] = None
+        state["_depth"] = 0
+        state["_observers"] = list()
+        return state
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def update(self, proposition):
+        """Returns a new version of the model with the context updated with proposition (this version is not changed)"""
+        version = self.fork()
+        version.set_alternatives(self.updated_alternatives(proposition))
+        return version
+
+    def rollback(self, steps=1):
+        """Returns the version this version was forked (or updated) from, steps (at most HISTORY_LIMIT) versions back"""
+        if steps > min(self._depth, HISTORY_LIMIT):
+            raise ValueError("there is no earlier version to roll back to")
+        version = self
+        for _ in range(steps):
+            version = version._parent
+        return version
+
+    def unshare(self):
+        """Copies the tables this version shares with other versions, before they are changed"""
+        if not self._shared:
+            return
+        self.worlds = set(self.worlds)
+        self.valuation = defaultdict(set, [(atom, set(worlds)) for atom, worlds in self.valuation.items()])
+        self.information_states = dict(self.information_states)
+        self._world_index = dict(self._world_index)
+        self._world_names = list(self._world_names)
+        self._free_bits = list(self._free_bits)
+        self._world_atoms = dict([(w, set(atoms)) for w, atoms in self._world_atoms.items()])
+        self._shared = False
+
+    def observe(self, observer):
+        """Registers a function that is called with the components of the model touched by every change"""
+        self._observers.append(observer)
+
+    def unobserve(self, observer):
+        self._observers.remove(observer)
+
+    def notify(self, *components):
+        for observer in self._observers:
+            observer(components)
+
+    def set_atom(self, w, atom):
+        self.unshare()
+        w = intern(w)
+        self.valuation[atom].add(w)
+        self._world_atoms.setdefault(w, set()).add(atom)
+        self.notify(("atom", atom))
+
+    def to_mask(self, state):
+        """Returns the bitmask of an information state (all worlds should be in the model)"""
+        mask = 0
+        for w in state:
+            mask |= 1 << self._world_index[w]
+        return mask
+
+    def from_mask(self, mask):
+        """Returns the information state (frozenset of worlds) of a bitmask"""
+        return frozenset([self._world_names[i] for i in fn.bits(mask)])
+
+    @property
+    def context(self):
+        """The context as a set of information states (the downward closure of the alternatives)"""
+        if self._context is None:
+            self._context = set([self.from_mask(s) for a in self._alternatives for s in fn.submasks(a)])
+        return self._context
+
+    @context.setter
+    def context(self, states):
+        """Sets the context to the downward closure of the states, states containing worlds outside the model are dropped"""
+        masks = [self.to_mask(s) for s in states if all([w in self._world_index for w in s])]
+        self.set_alternatives(fn.maximal_masks(masks))
+
+    def set_alternatives(self, alternatives):
+        """Sets the alternatives (antichain of bitmasks) of the context"""
+        self._alternatives = alternatives
+        self._context = None
+        self.notify(("context",))
+
+    def context_masks(self):
+        """Returns the alternatives of the context as bitmasks"""
+        return list(self._alternatives)
+
+    def context_alternatives(self):
+        """Returns the alternatives of the context (maximal information states)"""
+        return set([self.from_mask(a) for a in self._alternatives])
+
+    def in_context(self, state):
+        """Checks whether the information state is in the context, without computing the context"""
+        if not all([w in self._world_index for w in state]):
+            return False
+        mask = self.to_mask(state)
+        return any([(mask & ~a) == 0 for a in self._alternatives])
 
     def clean_valuations(self):
         """"removes all worlds that are not also in worlds"""
+        self.unshare()
         for key, value in self.valuation.items():
-            new_value = [w for w in value if w in self.worlds]
-            self.valuation[key] = new_value
+            if not value.issubset(self.worlds):
+                self.valuation[key] = set([w for w in value if w in self.worlds])
+                self.notify(("atom", key))
+        self._world_atoms = dict([(w, atoms) for w, atoms in self._world_atoms.items() if w in self.worlds])
     
     def add_world(self, *args):
         """add a world to the set of worlds and also append the world to the correct valuations"""
+        self.unshare()
         
-        w = args[0]
+        w = intern(args[0])
         if w not in self.worlds:
             self.worlds.add(w)
+            if len(self._free_bits) > 0:
+                i = self._free_bits.pop()
+                self._world_names[i] = w
+            else:
+                i = len(self._world_names)
+                self._world_names.append(w)
+            self._world_index[w] = i
+            self.notify(("worlds",))
         
         if len(args) > 1:
-            valuation = ""
-            for arg in args[1:]:
-                valuation += arg + " "
-            valuation = re.split(",|;|\s|:",valuation.strip())
-            for val in valuation:
-                self.valuation[val].add(w)
+            for atom in VALUATION_SEPARATORS.split(" ".join(args[1:])):
+                if atom != "":
+                    self.set_atom(w, intern(atom))
 
     def remove_world(self, *args):
-        """Removes a world from the model"""
+        """Removes a world from the model, only the valuations of its atoms and the alternatives containing it are touched"""
+        self.unshare()
         w = args[0]
         if w in self.worlds:
             self.worlds.remove(w)
-
-        if len(self.context) > 0:
-            for infstate in deepcopy(self.context):
-                if w in infstate:
-                    self.context.remove(infstate)
+            i = self._world_index.pop(w)
+            self._world_names[i] = None
+            self._free_bits.append(i)
+            self.notify(("worlds",))
+
+            # removing all information states containing w from the context means removing w from the alternatives
+            bit = 1 << i
+            changed = [a & ~bit for a in self._alternatives if a & bit]
+            if len(changed) > 0:
+                kept = [a for a in self._alternatives if not a & bit]
+                changed = [c for c in fn.maximal_masks(changed) if all([(c & ~a) != 0 for a in kept])]
+                self.set_alternatives(kept + changed)
         
-        if len(self.valuation) > 0:
-            for key, value in self.valuation.items():
-                if w in value:
-                    self.valuation[key].remove(w)
+        for atom in self._world_atoms.pop(w, set()):
+            self.valuation[atom].discard(w)
+            self.notify(("atom", atom))
 
     def set_worlds(self, worlds):
         """"Set the worlds to the set of worlds given"""
-        self.worlds = worlds
+        worlds = set(worlds)
+        for w in self.worlds.difference(worlds):
+            self.remove_world(w)
+        for w in worlds.difference(self.worlds):
+            self.add_world(w)
         self.clean_valuations()
 
     def set_context(self, context, prune=True):
-        """Set current context to context"""
-        self.context = set([tuple()])
+        """
+            Set current context to context (the downward closure of the given alternatives)
+
+            Note: the alternatives are always restricted to the worlds of the model, since states containing other worlds
+                cannot be represented. prune is kept for compatibility.
+        """
+        masks = [0]
         for alternative in context:
-            self.context = self.context.union(fn.set_powerset(alternative))
+            masks.append(self.to_mask([w for w in alternative if w in self._world_index]))
+        self.set_alternatives(fn.maximal_masks(masks))
         if prune:
             self.prune_context()
         
 
     def set_ignorant(self):
         """"Set the ignorant context"""
-        self.context = fn.set_powerset(self.worlds)
+        self.set_alternatives([self.to_mask(self.worlds)])
 
     def update_context(self, proposition):
         """Update the context with proposition"""
-        self.context = self.context.intersection(proposition.eval(self))
+        self.set_alternatives(self.updated_alternatives(proposition))
+
+    def updated_alternatives(self, proposition):
+        """
+            Returns the alternatives of the context updated with proposition, without computing the context.
+            Both are downward closed, so the alternatives of the intersection are the maximal pairwise intersections.
+        """
+        import iterative
+        states = fn.maximal_masks([self.to_mask(s) for s in iterative.dispatch(proposition, self)])
+        return fn.maximal_masks([a & b for a in self._alternatives for b in states])
 
     def prune_context(self):
         """Removes all information states from the context containing worlds that are not contained in the model"""
-        self.context = set([c for c in self.context if all([True if w in self.worlds else False for w in c ])]) 
+        full = self.to_mask(self.worlds)
+        if any([a & ~full for a in self._alternatives]):
+            self.set_alternatives(fn.maximal_masks([a & full for a in self._alternatives]))
 
     def add_information_state(self, name, information_state):
         """Add an information state"""
+        self.unshare()
         self.information_states[name] = information_state
+        self.notify(("state", name))
 
     def get_information_state(self, name):
         """Returns the information state or False when there is none with that name"""
@@ -114,7 +320,10 @@ class Model:
             return False
 
     def reset_information_states(self):
+        self.unshare()
+        names = list(self.information_states.keys())
         self.information_states = dict()
+        self.notify(*[("state", name) for name in names])
 
     def freeze_dict(self, this_dict):
         """Searches through dictionairy and freezes all elements into lists"""
@@ -127,6 +336,25 @@ class Model:
 
         return this_dict
 
+    def to_dict(self):
+        """Returns the model as a dictionary, the context is given by its alternatives"""
+        return {"worlds": set(self.worlds),
+                "context": [list(a) for a in self.context_alternatives()],
+                "valuation": dict([(k, set(v)) for k, v in self.valuation.items()]),
+                "information_states": dict(self.information_states)}
+
+
+    def fingerprint(self):
+        """
+            Returns a hash of the content of the model, equal models (regardless of world order or bit indices) have equal fingerprints.
+        """
+        canonical = {"worlds": sorted([str(w) for w in self.worlds]),
+                     "context": sorted([sorted([str(w) for w in a]) for a in self.context_alternatives()]),
+                     "valuation": dict([(str(k), sorted([str(w) for w in v])) for k, v in self.valuation.items() if len(v) > 0]),
+                     "information_states": dict([(str(k), sorted([str(w) for w in v])) for k, v in self.information_states.items()])}
+        import hashlib
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
 
     """Note: These save and load functions are very much not safe! because they just (un)pickle binaries"""
     def save(self, location):
@@ -135,15 +363,12 @@ class Model:
             location += '.p'
 
         # prepare values
-        retdict = self.freeze_dict(self.__dict__)
+        retdict = self.freeze_dict(self.to_dict())
 
         # save file
         with open(location, "w") as f:
             json.dump(retdict, f)
 
-        # repair any frozen elements
-        self.unfreeze(self.__dict__)
-
     def unfreeze(self, this_dict):
         """
             unfreezes the dictionary into the right types. Notice how this is dependend on the datatypes used by this model Class.
@@ -161,6 +386,118 @@ class Model:
 
         return this_dict
 
+    @classmethod
+    def from_truth_table(cls, table, worlds=None, atoms=None, context=None):
+        """
+            Builds a model in one pass from a truth table with a row per world and a column per atom.
+
+            table: a 2d numpy array or a list of rows with truth values, or the path of (or a file object with) a csv file
+                whose header row holds the atoms and whose first column holds the world names. A pandas dataframe is
+                read by from_dataframe, names that are not given are taken from its index and columns.
+            worlds, atoms: names of the rows and columns (default w1, w2, ... and p1, p2, ...), ignored for csv files.
+            context: boolean matrix with a row per alternative and a column per world.
+
+            Note: numpy arrays are handled column-wise by numpy, numpy itself is never imported when it is not used already.
+        """
+        if type(table) == str or hasattr(table, "read"):
+            worlds, atoms, table = cls.read_truth_table(table)
+
+        if type(table).__module__.startswith("pandas"):
+            # iterating a dataframe yields its column labels, not its rows
+            if worlds is None and atoms is None:
+                return cls.from_dataframe(table, context)
+            worlds = worlds if worlds is not None else [str(w) for w in table.index]
+            atoms = atoms if atoms is not None else [str(a) for a in table.columns]
+            table = table.to_numpy(dtype=bool)
+
+        columnwise = type(table).__module__.startswith("numpy")
+        if columnwise:
+            import numpy
+            table = numpy.asarray(table, dtype=bool)
+            n, k = table.shape
+        else:
+            table = [[bool(v) for v in row] for row in table]
+            n, k = len(table), (len(table[0]) if len(table) > 0 else len(atoms or []))
+
+        worlds = [intern(w) for w in (worlds if worlds is not None else ["w" + str(i + 1) for i in range(n)])]
+        atoms = [intern(a) for a in (atoms if atoms is not None else ["p" + str(j + 1) for j in range(k)])]
+        if len(worlds) != n or len(atoms) != k:
+            raise ValueError("the number of world and atom names does not match the shape of the table")
+        if len(set(worlds)) != n:
+            raise ValueError("world names should be unique")
+        if context is not None:
+            context = list(context)
+            if any([len(row) != n for row in context]):
+                raise ValueError("every row of the context should have a column per world")
+
+        model = cls()
+        model.worlds = set(worlds)
+        model._world_names = list(worlds)
+        model._world_index = dict([(w, i) for i, w in enumerate(worlds)])
+        model._world_atoms = dict([(w, set()) for w in worlds])
+
+        if columnwise:
+            names = numpy.array(worlds, dtype=object)
+            for j, atom in enumerate(atoms):
+                true_worlds = names[table[:, j]].tolist()
+                model.valuation[atom] = set(true_worlds)
+                for w in true_worlds:
+                    model._world_atoms[w].add(atom)
+        else:
+            for atom in atoms:
+                model.valuation[atom] = set()
+            for w, row in zip(worlds, table):
+                for atom, value in zip(atoms, row):
+                    if value:
+                        model.valuation[atom].add(w)
+                        model._world_atoms[w].add(atom)
+
+        if context is not None:
+            model._alternatives = fn.maximal_masks([cls.row_mask(row) for row in context])
+
+        return model
+
+    @classmethod
+    def from_dataframe(cls, dataframe, context=None):
+        """Builds a model from a (pandas) dataframe with a boolean column per atom, the index holds the world names"""
+        return cls.from_truth_table(dataframe.to_numpy(dtype=bool),
+                                    worlds=[str(w) for w in dataframe.index],
+                                    atoms=[str(a) for a in dataframe.columns],
+                                    context=context)
+
+    @staticmethod
+    def read_truth_table(location):
+        """Reads a csv truth table, returns the world names, the atoms and the rows of truth values"""
+        if type(location) == str:
+            with open(location, "r", newline="") as f:
+                return Model.read_truth_table(f)
+
+        import csv
+        reader = csv.reader(location)
+        header = next(reader)
+        worlds, rows = [], []
+        truth = dict() # tables only use a handful of distinct cell values
+        for line in reader:
+            if len(line) == 0:
+                continue
+            worlds.append(line[0].strip())
+            row = []
+            for cell in line[1:]:
+                if cell not in truth:
+                    truth[cell] = cell.strip().lower() in TRUE_CELLS
+                row.append(truth[cell])
+            rows.append(row)
+        return worlds, [a.strip() for a in header[1:]], rows
+
+    @staticmethod
+    def row_mask(row):
+        """Returns the bitmask of a boolean row with a column per world (bit i is column i)"""
+        if type(row).__module__.startswith("numpy"):
+            import numpy
+            return int.from_bytes(numpy.packbits(numpy.asarray(row, dtype=bool), bitorder="little").tobytes(), "little")
+        # building the binary string first keeps this linear in the number of worlds
+        return int("0" + "".join(["1" if value else "0" for value in reversed(list(row))]), 2)
+
     @classmethod
     def load(self, location):
         if not location.endswith('.p'):
@@ -171,7 +508,7 @@ class Model:
         return Model(**self.unfreeze(None, res))
 
     def __str__(self):
-        return str(self.__dict__)
+        return str({"worlds": self.worlds, "context": self.context, "valuation": self.valuation, "information_states": self.information_states})
 
 
 
@@ -0,0 +1,143 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import func as fn
+import expressions as exp
+
+
+# Registry of evaluation backends.
+# A backend is a function (formula, model) that returns the result in the format of Expression.eval_alt:
+# the set of alternatives for sentences and the truth value (or "syntax error") for |= expressions.
+# The reference semantics is "eval", every other backend should agree with it (see fuzz.py).
+# Installed packages can add backends through the entry point group below, they are only looked up (and imported)
+# when a backend is asked for that is not registered here.
+
+BACKENDS = dict()
+ENTRY_POINT_GROUP = "inquisitive_logic.backends"
+_discovered = False
+
+def register(name, backend):
+    """Registers (or replaces) a backend under name"""
+    BACKENDS[name] = backend
+
+def discover():
+    """Registers the backends of installed packages (entry points), once"""
+    global _discovered
+    if _discovered:
+        return
+    _discovered = True
+
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name not in BACKENDS:
+            register(entry_point.name, entry_point.load())
+
+def get(name):
+    if name not in BACKENDS:
+        discover()
+    if name not in BACKENDS:
+        raise KeyError("unknown backend " + str(name) + ", available: " + ", ".join(names()))
+    return BACKENDS[name]
+
+def names():
+    discover()
+    return sorted(BACKENDS.keys())
+
+def alternatives(result):
+    """Reduces full propositions to their alternatives, other results are returned as they are"""
+    if type(result) == set:
+        return fn.alternatives(result)
+    return result
+
+
+def eval_backend(formula, model):
+    return alternatives(formula.eval(model))
+
+def eval_alt_backend(formula, model):
+    return formula.eval_alt(model)
+
+def zdd_backend(formula, model):
+    import zdd
+    return alternatives(zdd.evaluate(formula, model))
+
+def support_backend(formula, model):
+    """Builds the proposition from the support checker, state by state"""
+    memo = dict()
+    if type(formula) == exp.ModelsOp and type(formula.l) in (exp.InformationStateExp, exp.ContextExp):
+        if type(formula.r) in (exp.ContextExp, exp.InformationStateExp, exp.ModelsOp):
+            return formula.eval_alt(model)
+        if type(formula.l) == exp.InformationStateExp:
+            return exp.supports(model, formula.l.eval(model), formula.r, memo)
+        return all([exp.supports(model, alt, formula.r, memo) for alt in model.context_alternatives()])
+
+    return fn.alternatives(set([s for s in fn.set_powerset(model.worlds) if exp.supports(model, s, formula, memo)]))
+
+def optimized_backend(formula, model):
+    from optimizer import optimize
+    return optimize(formula)[0].eval_alt(model)
+
+def planned_backend(formula, model):
+    import planner
+    return planner.evaluate(formula, model)
+
+def outofcore_backend(formula, model):
+    """Evaluates out of core with a tiny memory ceiling, so that every run of more than a few states goes to disk"""
+    import outofcore
+    res = outofcore.evaluate(formula, model, memory=256)
+    if isinstance(res, outofcore.DiskProposition):
+        with res:
+            return fn.alternatives(set(res))
+    return res
+
+def shared_backend(formula, model):
+    """Evaluates on a read-only view of the model in shared memory"""
+    import shared
+    with shared.SharedModel(model) as published:
+        return formula.eval_alt(shared.attach(published.name))
+
+def forced_parallel(evaluate):
+    """Wraps a backend such that every implication is evaluated by worker processes, regardless of its size"""
+    def backend(formula, model):
+        workers, min_worlds, min_choices = exp._workers, exp.PARALLEL_MIN_WORLDS, exp.PARALLEL_MIN_CHOICES
+        exp.set_workers(2)
+        exp.PARALLEL_MIN_WORLDS, exp.PARALLEL_MIN_CHOICES = 0, 0
+        try:
+            return evaluate(formula, model)
+        finally:
+            exp.set_workers(workers)
+            exp.PARALLEL_MIN_WORLDS, exp.PARALLEL_MIN_CHOICES = min_worlds, min_choices
+    return backend
+
+register("eval", eval_backend)
+register("alt", eval_alt_backend)
+register("zdd", zdd_backend)
+register("support", support_backend)
+register("optimized", optimized_backend)
+register("shared", shared_backend)
+register("planned", planned_backend)
+register("outofcore", outofcore_backend)
+register("parallel", forced_parallel(eval_backend))
+register("parallel-alt", forced_parallel(eval_alt_backend))
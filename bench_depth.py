@@ -0,0 +1,104 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import argparse
+import sys
+import time
+
+import expressions as exp
+import iterative
+from ILL_parser import parse
+from InquisitiveLogicModelChecker import Model
+
+
+# Compares the recursive evaluation (eval, eval_alt, str) with the explicit stack evaluation of iterative.py on chains
+# of nested operators. Each family maps to its builder and the largest depth at which the recursive path is run (None
+# for no bound besides the recursion limit). The recursive WhetherOp evaluates its argument twice, so nested "not ?"
+# chains take exponential time there and are only run recursively for small depths.
+
+FAMILIES = {
+    "and": (lambda d: "p and (" * d + "?q" + ")" * d, None),
+    "then": (lambda d: "(p ior q) then (" * d + "?q" + ")" * d, None),
+    "not": (lambda d: "not ? " * (d // 2) + "p", 30),
+}
+
+def sample_model():
+    model = Model(worlds={"w1", "w2", "w3"}, valuation={"p": {"w1", "w2"}, "q": {"w2", "w3"}})
+    model.set_ignorant()
+    return model
+
+def best_time(function, runs):
+    """Minimum wall clock time (ms) of function over runs, and its result"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        res = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times), res
+
+def compare(recursive, expected, runs, name):
+    """Time the recursive function and check it against the iterative result, '-' when it is skipped or overflows"""
+    if recursive is None:
+        return "%9s" % "-"
+    try:
+        recursive_time, res = best_time(recursive, runs)
+    except RecursionError:
+        return "%9s" % "-"
+    if res != expected:
+        raise AssertionError("iterative " + name + " differs from the recursive one")
+    return "%9.2f" % recursive_time
+
+def bench(family, depth, runs, model):
+    builder, recursive_max = FAMILIES[family]
+    tree = parse(builder(depth))
+    recursive = recursive_max is None or depth <= recursive_max
+    row = [family, str(depth)]
+    for mode in ("eval", "eval_alt"):
+        iterative_time, res = best_time(lambda: iterative.evaluate(tree, model, mode), runs)
+        row.append(compare((lambda: getattr(tree, mode)(model)) if recursive else None, res, runs, mode))
+        row.append("%9.2f" % iterative_time)
+    iterative_time, string = best_time(lambda: iterative.to_string(tree), runs)
+    row.append(compare(lambda: str(tree), string, runs, "str"))
+    row.append("%9.2f" % iterative_time)
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recursive versus explicit stack evaluation of deeply nested formulas")
+    parser.add_argument("--depths", default="10,50,100,200,400,1000,100000")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # the persistent cache would time lookups instead of evaluations
+    exp.set_cache(None)
+    model = sample_model()
+    print("times in ms, '-' when the recursive path is skipped or exceeds the recursion limit (%d)" % sys.getrecursionlimit())
+    print("%-6s %7s %9s %9s %9s %9s %9s %9s" % ("", "depth", "eval", "iter", "eval_alt", "iter", "str", "iter"))
+    for family in FAMILIES:
+        for depth in [int(d) for d in args.depths.split(",")]:
+            runs = args.runs if depth <= 1000 else 1
+            row = bench(family, depth, runs, model)
+            print("%-6s %7s %s" % (row[0], row[1], " ".join(row[2:])))
@@ -0,0 +1,98 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from InquisitiveLogicModelChecker import Model
+
+
+# Cold start benchmark of the one-shot "check" mode of main.py.
+#
+# Every run starts a fresh interpreter, the time of a bare interpreter ("python -c pass") is subtracted so that the
+# budget only covers the start up of the model checker itself. The benchmark also fails when a check loads one of the
+# modules that should only be imported on demand.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# modules that a plain point query should not import
+LAZY_MODULES = ("zdd", "sat", "entailment", "cache", "parallel", "shared", "planner", "counting", "outofcore", "backends", "fuzz",
+                "sqlite3", "concurrent.futures", "csv", "hashlib", "numpy", "bitarray")
+
+def median_time(command, runs):
+    """Median wall clock time (ms) of running command in a fresh process"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        # the exit status of a check is its truth value, so it is not checked here
+        subprocess.run(command, cwd=HERE, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+def loaded_modules(check_args):
+    """The modules (of LAZY_MODULES) that are imported by a check"""
+    code = "import sys, main; main.check(sys.argv[1:]); print(' '.join(sorted(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code] + check_args, cwd=HERE, check=True, capture_output=True, text=True).stdout
+    modules = set(out.splitlines()[-1].split())
+    return [m for m in LAZY_MODULES if m in modules]
+
+def sample_model(location):
+    model = Model(worlds={"w1", "w2", "w3"}, valuation={"p": {"w1", "w2"}, "q": {"w2", "w3"}})
+    model.set_ignorant()
+    model.save(location)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start benchmark of the one-shot check mode of main.py")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=100, help="maximum start up time (ms) on top of a bare interpreter")
+    parser.add_argument("--formula", default="C models (p then ?q)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        location = os.path.join(directory, "model.p")
+        sample_model(location)
+        check_args = ["--model", location, "--formula", args.formula]
+
+        # the persistent cache would add its own start up time
+        os.environ.pop("INQUISITIVE_CACHE_DIR", None)
+        baseline = median_time([sys.executable, "-c", "pass"], args.runs)
+        check = median_time([sys.executable, "main.py", "check"] + check_args, args.runs)
+        eager = loaded_modules(check_args)
+
+    overhead = check - baseline
+    print("interpreter %8.1f ms" % baseline)
+    print("check       %8.1f ms" % check)
+    print("start up    %8.1f ms (budget %.1f ms)" % (overhead, args.budget))
+    if len(eager) > 0:
+        print("imported eagerly: " + ", ".join(eager))
+
+    sys.exit(1 if overhead > args.budget or len(eager) > 0 else 0)
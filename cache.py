@@ -0,0 +1,184 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import expressions as exp
+from optimizer import children
+
+
+# Persistent evaluation cache, shared between runs and (worker) processes.
+# Results are stored in a SQLite database (write ahead logging, so readers and a writer do not block each other),
+# keyed by the hash of (model fingerprint, formula hash, evaluation mode).
+
+# formulas that are the same up to the order of the arguments of these operators get the same hash
+COMMUTATIVE = (exp.AndOp, exp.InqOrOp, exp.OrOp)
+
+def formula_hash(tree):
+    """Returns a canonical hash of the formula, computed bottom-up with an explicit stack"""
+    hashes = dict()
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack[-1]
+        pending = [c for c in children(node) if id(c) not in hashes]
+        if len(pending) > 0:
+            stack.extend(pending)
+            continue
+        stack.pop()
+
+        if isinstance(node, exp.VariableExp):
+            parts = [type(node).__name__, str(node.name)]
+            if type(node) == exp.InformationStateExp and node.informationState is not None:
+                parts += sorted([str(w) for w in node.informationState])
+        else:
+            parts = [hashes[id(c)] for c in children(node)]
+            if isinstance(node, COMMUTATIVE):
+                parts.sort()
+            parts.insert(0, type(node).__name__)
+        hashes[id(node)] = hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+    return hashes[id(tree)]
+
+def encode(value):
+    """Encodes an evaluation result as json, sets of worlds are stored as sorted lists"""
+    if type(value) == set:
+        return json.dumps({"proposition": sorted([sorted(state, key=str) for state in value])})
+    if type(value) == frozenset:
+        return json.dumps({"state": sorted(value, key=str)})
+    return json.dumps({"value": value})
+
+def decode(string):
+    res = json.loads(string)
+    if "proposition" in res:
+        return set([frozenset(state) for state in res["proposition"]])
+    if "state" in res:
+        return frozenset(res["state"])
+    return res["value"]
+
+
+class EvaluationCache():
+    """
+        Content addressed cache of evaluation results in a local directory.
+
+        Note: the total size of the stored results is kept below max_bytes by evicting the least recently used entries.
+    """
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "evaluations.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.pid = None
+        self.db = None
+        self.connect()
+
+    def connect(self):
+        """(Re)connects to the database, connections cannot be shared with forked worker processes"""
+        self.pid = os.getpid()
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)")
+        self.db.execute("INSERT OR IGNORE INTO total VALUES (0, 0)")
+
+    def connection(self):
+        if self.pid != os.getpid():
+            self.connect()
+        return self.db
+
+    def key(self, model, formula, mode):
+        return hashlib.sha256("\x00".join([model.fingerprint(), formula_hash(formula), mode]).encode()).hexdigest()
+
+    def get(self, key):
+        """Returns (True, result) on a hit and (False, None) on a miss"""
+        db = self.connection()
+        row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        try:
+            db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            pass # recency is best effort, a busy database should not turn a hit into an error
+        return True, decode(row[0])
+
+    def put(self, key, value):
+        value = encode(value)
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            old = 0 if row is None else row[0]
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, value, len(value), time.time()))
+            db.execute("UPDATE total SET size = size + ? WHERE id = 0", (len(value) - old,))
+            self.evict(db)
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+
+    def evict(self, db):
+        """Removes the least recently used results until the total size is below max_bytes (within a transaction)"""
+        total = db.execute("SELECT size FROM total WHERE id = 0").fetchone()[0]
+        while total > self.max_bytes:
+            rows = db.execute("SELECT key, size FROM results ORDER BY used LIMIT 64").fetchall()
+            if len(rows) == 0:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+        db.execute("UPDATE total SET size = ? WHERE id = 0", (total,))
+
+    def evaluate(self, formula, model, mode, compute):
+        """Returns the cached result of compute(formula, model), computing and storing it on a miss"""
+        key = self.key(model, formula, mode)
+        found, value = self.get(key)
+        if not found:
+            value = compute(formula, model)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM results")
+        db.execute("UPDATE total SET size = 0 WHERE id = 0")
+        db.execute("COMMIT")
+
+    def __str__(self):
+        db = self.connection()
+        count = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        size = db.execute("SELECT size FROM total WHERE id = 0").fetchone()[0]
+        return "cache " + self.path + ": " + str(count) + " results, " + str(size) + " bytes, " + str(self.hits) + " hits, " + str(self.misses) + " misses"
@@ -0,0 +1,117 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import sys
+
+import func as fn
+import iterative
+import zdd
+
+
+# Counting information states and alternatives without materializing propositions.
+#
+# The number of states supporting a sentence is the size of the downward closure of its alternatives. It is computed by
+# inclusion-exclusion over the intersections of the alternatives (equal intersections are merged), and when there are
+# too many distinct intersections by splitting on a world: the states without it and the states with it are again
+# downward closures of antichains (memoized). Sentences are evaluated with the ZDD backend, whose families are counted
+# node by node.
+
+# inclusion-exclusion gives up above this many distinct intersections
+MAX_TERMS = 4096
+
+def inclusion_exclusion(masks, max_terms=None):
+    """
+        Size of the downward closure of the masks: the sum over non-empty subsets S of (-1)^(|S|+1) 2^|intersection of S|.
+        Returns None when there are more than max_terms distinct intersections.
+    """
+    terms = dict() # intersection -> coefficient
+    for a in masks:
+        new = {a: 1}
+        for m, c in terms.items():
+            new[m & a] = new.get(m & a, 0) - c
+        for m, c in new.items():
+            terms[m] = terms.get(m, 0) + c
+            if terms[m] == 0:
+                del terms[m]
+        if max_terms is not None and len(terms) > max_terms:
+            return None
+    return sum([c << bin(m).count("1") for m, c in terms.items()])
+
+def count_closure(masks, memo=None):
+    """
+        Returns the number of information states in the downward closure of the bitmasks.
+
+        count_closure([0b011, 0b110]) --> 6     ({}, {0}, {1}, {2}, {0,1}, {1,2})
+    """
+    masks = fn.maximal_masks(masks)
+    res = inclusion_exclusion(masks, MAX_TERMS)
+    if res is not None:
+        return res
+
+    if memo is None:
+        # the split descends one world per call, the previous recursion limit is restored afterwards
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 4 * max(masks).bit_length() + 1000))
+        try:
+            return count_closure(masks, dict())
+        finally:
+            sys.setrecursionlimit(limit)
+
+    key = frozenset(masks)
+    if key not in memo:
+        # split on the world contained in the most alternatives: states without it, and states with it
+        counts = dict()
+        for a in masks:
+            for i in fn.bits(a):
+                counts[i] = counts.get(i, 0) + 1
+        bit = 1 << max(counts, key=counts.get)
+        without = count_closure([a & ~bit for a in masks], memo)
+        with_bit = count_closure([a & ~bit for a in masks if a & bit], memo)
+        memo[key] = without + with_bit
+    return memo[key]
+
+def count_states(formula, model):
+    """
+        Returns the number of information states supporting the sentence (len(formula.eval(model)) without computing it).
+        The truth value is returned for |= expressions.
+    """
+    with zdd.get_manager(model).deep() as manager:
+        res = iterative.dispatch(formula, model, "eval_zdd", manager)
+        if type(res) != int:
+            return res
+        return manager.count(res)
+
+def count_alternatives(formula, model):
+    """Returns the number of alternatives of the sentence (len(formula.eval_alt(model)) without computing them)"""
+    with zdd.get_manager(model).deep() as manager:
+        res = iterative.dispatch(formula, model, "eval_zdd", manager)
+        if type(res) != int:
+            return res
+        return manager.count(manager.maximal(res))
+
+def count_context(model):
+    """Returns the number of information states in the context of the model, which is never computed"""
+    return count_closure(model.context_masks())
@@ -0,0 +1,193 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import expressions as exp
+import sat
+from InquisitiveLogicModelChecker import Model
+
+
+# SAT based search for countermodels of entailments: phi entails psi iff every state supporting phi supports psi (in every model).
+#
+# Note: support of a formula in a state s only depends on the substates of s, and worlds with the same valuation can be merged.
+#   Hence a countermodel can always be taken such that the set of all worlds is the counterexample state
+#   and such that the worlds have pairwise distinct valuations (so at most 2^k worlds for k atoms).
+
+class Encoder():
+    """
+        Encodes the support semantics of formulas into CNF for a model with n worlds.
+        Every (sub)formula gets one support variable per information state (bitmask over the n worlds).
+    """
+    def __init__(self, n, atoms):
+        self.n = n
+        self.nvars = 0
+        self.clauses = []
+        self.encoded = dict()
+
+        self.true = self.new_var()
+        self.clauses.append([self.true])
+
+        # valuation variables: val[atom][w] is true iff atom holds in world w
+        self.val = dict()
+        for atom in atoms:
+            self.val[atom] = [self.new_var() for w in range(n)]
+
+    def new_var(self):
+        self.nvars += 1
+        return self.nvars
+
+    def and_gate(self, lits):
+        if any([l == -self.true for l in lits]):
+            return -self.true
+        lits = [l for l in lits if l != self.true]
+        if len(lits) == 0:
+            return self.true
+        if len(lits) == 1:
+            return lits[0]
+
+        y = self.new_var()
+        for l in lits:
+            self.clauses.append([-y, l])
+        self.clauses.append([y] + [-l for l in lits])
+        return y
+
+    def or_gate(self, lits):
+        return -self.and_gate([-l for l in lits])
+
+    def iff_gate(self, a, b):
+        return self.and_gate([self.or_gate([-a, b]), self.or_gate([a, -b])])
+
+    def states(self):
+        return range(1 << self.n)
+
+    def per_world(self, lits_of_world):
+        """Support variables of a formula that is supported by a state iff each of its worlds satisfies a condition"""
+        S = [self.true]
+        for t in range(1, 1 << self.n):
+            low = (t & -t).bit_length() - 1
+            S.append(self.and_gate([S[t & (t - 1)], lits_of_world[low]]))
+        return S
+
+    def singletons(self, S):
+        return [S[1 << w] for w in range(self.n)]
+
+    def encode(self, node):
+        """Returns the list of support literals of the node, indexed by information state"""
+        if node in self.encoded:
+            return self.encoded[node]
+
+        if type(node) == exp.PropExp:
+            S = self.per_world(self.val[node.name])
+        elif type(node) == exp.NotOp:
+            S = self.per_world([-l for l in self.singletons(self.encode(node.r))])
+        elif type(node) == exp.WhetherOp:
+            R = self.encode(node.r)
+            N = self.per_world([-l for l in self.singletons(R)])
+            S = [self.or_gate([R[t], N[t]]) for t in self.states()]
+        elif type(node) == exp.AndOp:
+            L, R = self.encode(node.l), self.encode(node.r)
+            S = [self.and_gate([L[t], R[t]]) for t in self.states()]
+        elif type(node) == exp.InqOrOp:
+            L, R = self.encode(node.l), self.encode(node.r)
+            S = [self.or_gate([L[t], R[t]]) for t in self.states()]
+        elif type(node) == exp.OrOp:
+            L, R = self.encode(node.l), self.encode(node.r)
+            S = self.per_world([self.or_gate([l, r]) for l, r in zip(self.singletons(L), self.singletons(R))])
+        elif type(node) == exp.ThenOp:
+            # supported iff the implication holds locally and it is supported by all maximal proper substates
+            L, R = self.encode(node.l), self.encode(node.r)
+            S = [self.true]
+            for t in range(1, 1 << self.n):
+                subs = [S[t & ~(1 << w)] for w in range(self.n) if t & (1 << w)]
+                S.append(self.and_gate([self.or_gate([-L[t], R[t]])] + subs))
+        else:
+            raise ValueError("countermodel search only supports propositional formulas, not " + str(node))
+
+        self.encoded[node] = S
+        return S
+
+    def break_symmetry(self):
+        """Orders the worlds by strictly increasing valuation (lexicographically), which also makes all valuations distinct"""
+        atoms = sorted(self.val.keys())
+        for w in range(self.n - 1):
+            a = [self.val[atom][w] for atom in atoms]
+            b = [self.val[atom][w + 1] for atom in atoms]
+
+            equal = self.true
+            smaller = []
+            for x, y in zip(a, b):
+                smaller.append(self.and_gate([equal, -x, y]))
+                equal = self.and_gate([equal, self.iff_gate(x, y)])
+            self.clauses.append(smaller)
+
+
+def atoms_of(formula, res=None):
+    """Returns the set of atomic propositions occurring in the formula"""
+    if res is None:
+        res = set()
+    if type(formula) == exp.PropExp:
+        res.add(formula.name)
+    if isinstance(formula, exp.UnaryOp):
+        atoms_of(formula.r, res)
+    if isinstance(formula, exp.BinaryOp):
+        atoms_of(formula.l, res)
+        atoms_of(formula.r, res)
+    return res
+
+def find_countermodel(premise, conclusion, max_worlds=6):
+    """
+        Searches for a model in which the state of all worlds supports the premise but not the conclusion.
+        Models are tried with an increasing number of worlds, up to max_worlds.
+
+        Note: the search is complete when max_worlds is at least 2^k for k atoms, otherwise the absence of a countermodel
+            only means that there is none with at most max_worlds worlds.
+
+        Returns the countermodel, with the counterexample state added as information state "s", or None when there is none.
+    """
+    atoms = sorted(atoms_of(premise).union(atoms_of(conclusion)))
+
+    for n in range(1, min(max_worlds, 2 ** len(atoms)) + 1):
+        encoder = Encoder(n, atoms)
+        full = (1 << n) - 1
+        encoder.clauses.append([encoder.encode(premise)[full]])
+        encoder.clauses.append([-encoder.encode(conclusion)[full]])
+        encoder.break_symmetry()
+
+        res = sat.solve(encoder.clauses, encoder.nvars)
+        if res is None:
+            continue
+
+        true = set([l for l in res if l > 0])
+        model = Model()
+        for w in range(n):
+            model.add_world("w" + str(w + 1), *[atom for atom in atoms if encoder.val[atom][w] in true])
+        model.add_information_state("s", tuple(sorted(model.worlds)))
+        return model
+
+    return None
+
+def entails(premise, conclusion, max_worlds=6):
+    """Checks the entailment (up to max_worlds worlds, see find_countermodel)"""
+    return find_countermodel(premise, conclusion, max_worlds) is None
@@ -26,15 +26,137 @@
 
 from InquisitiveLogicModelChecker import Model
 import func as fn
-from copy import deepcopy
-from bitarray import bitarray
 import itertools
+import functools
+import threading
+import contextlib
+
+# persistent evaluation cache (see cache.py) consulted by the outermost eval/eval_alt call, None when disabled
+_cache = None
+_evaluating = threading.local()
+
+# number of worker processes for a single implication (see parallel.py), and the sizes below which it is not worth it
+_workers = 1
+PARALLEL_MIN_WORLDS = 12
+PARALLEL_MIN_CHOICES = 4096
+
+def set_workers(workers):
+    """Sets the number of processes ThenOp.eval and ThenOp.eval_alt may use (1 disables parallel evaluation)"""
+    global _workers
+    _workers = max(1, workers)
+
+def set_cache(cache):
+    """Sets the evaluation cache that eval and eval_alt consult transparently (None disables caching)"""
+    global _cache
+    _cache = cache
+
+def cached(method, mode):
+    """
+        Wraps an eval method such that the outermost call goes through the evaluation cache.
+        Nested calls (the evaluation of subformulas) are not cached, since hashing the model for every node would cost more than it saves.
+    """
+    @functools.wraps(method)
+    def wrapper(self, model):
+        if _workers > 1 and current_pool() is None:
+            with worker_pool(model):
+                return wrapper(self, model)
+
+        results = getattr(_evaluating, "results", None)
+        if results is not None and self in results[0]:
+            key = (self, mode)
+            if key not in results[1]:
+                results[1][key] = method(self, model)
+            return results[1][key]
+
+        if _cache is None or getattr(_evaluating, "active", False):
+            return method(self, model)
+
+        _evaluating.active = True
+        try:
+            return _cache.evaluate(self, model, mode, method)
+        finally:
+            _evaluating.active = False
+
+    return wrapper
+
+def stored(method, mode):
+    """Wraps an eval method without caching (eval_zdd), such that it only takes part in stored_results"""
+    @functools.wraps(method)
+    def wrapper(self, model, *args):
+        results = getattr(_evaluating, "results", None)
+        if results is not None and self in results[0]:
+            key = (self, mode)
+            if key not in results[1]:
+                results[1][key] = method(self, model, *args)
+            return results[1][key]
+        return method(self, model, *args)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def stored_results(nodes, results):
+    """
+        Within this context eval, eval_alt and eval_zdd of the nodes (a set of formula nodes) return the result stored in results
+        under (node, mode), results that are missing are computed and stored. The persistent cache is not consulted.
+    """
+    previous = (getattr(_evaluating, "results", None), getattr(_evaluating, "active", False))
+    _evaluating.results, _evaluating.active = (nodes, results), True
+    try:
+        yield
+    finally:
+        _evaluating.results, _evaluating.active = previous
+
+
+@contextlib.contextmanager
+def worker_pool(model):
+    """
+        The implications evaluated in parallel on model within this context share one pool of worker processes,
+        which is started by the first of them (see parallel.Session). Nested contexts use the pool of the outermost one.
+    """
+    if _workers <= 1 or current_pool() is not None:
+        yield
+        return
+    import parallel
+    _evaluating.pool = parallel.Session(model, _workers)
+    try:
+        yield
+    finally:
+        pool, _evaluating.pool = _evaluating.pool, None
+        pool.close()
+
+def current_pool():
+    """The parallel.Session of the evaluation in progress, or None"""
+    return getattr(_evaluating, "pool", None)
+
 
 class Expression ():
     """
         This is the main class for any expression
     """
-    pass
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for mode in ("eval", "eval_alt"):
+            if mode in cls.__dict__:
+                setattr(cls, mode, cached(cls.__dict__[mode], mode))
+        if "eval_zdd" in cls.__dict__:
+            setattr(cls, "eval_zdd", stored(cls.__dict__["eval_zdd"], "eval_zdd"))
+
+
+def supports(model, state, formula, memo=None):
+    """
+        Checks whether the information state supports the formula, without computing the proposition of the formula.
+        Results are memoized per (formula node, information state) in memo, which can be shared between calls on the same model.
+    """
+    if memo is None:
+        memo = dict()
+    if type(state) != frozenset:
+        state = frozenset(state)
+
+    key = (formula, state)
+    if key not in memo:
+        memo[key] = formula.support(model, state, memo)
+    return memo[key]
 
 
 class UnaryOp(Expression):
@@ -76,6 +198,15 @@ class WhetherOp(UnaryOp):
     def eval_alt(self, model):
         return InqOrOp(self.r, NotOp(self.r)).eval_alt(model)
 
+    def eval_zdd(self, model, manager):
+        reval = self.r.eval_zdd(model, manager)
+        return manager.union(reval, manager.powerset(model.worlds.difference(manager.support(reval))))
+
+    def support(self, model, state, memo):
+        if supports(model, state, self.r, memo):
+            return True
+        return all([not supports(model, frozenset([w]), self.r, memo) for w in state])
+
 class NotOp(UnaryOp):
     """
         Implements the not operator
@@ -94,6 +225,17 @@ class NotOp(UnaryOp):
         ret = set([diff])
         return ret
 
+    def eval_zdd(self, model, manager):
+        reval = self.r.eval_zdd(model, manager)
+        return manager.powerset(model.worlds.difference(manager.support(reval)))
+
+    def support(self, model, state, memo):
+        # a world is in the informative content of a (downward closed) proposition iff its singleton state is in it
+        for w in state:
+            if supports(model, frozenset([w]), self.r, memo):
+                return False
+        return True
+
 class ModelsOp(BinaryOp):
     """
         Implements the Models operator
@@ -102,6 +244,10 @@ class ModelsOp(BinaryOp):
         return str(self.l) + " |= " + str(self.r) 
 
     def eval(self, model):
+        if type(self.l) == InformationStateExp and type(self.r) not in (ContextExp, InformationStateExp, ModelsOp):
+            # fast path: check support directly instead of computing the proposition of the right hand side
+            return supports(model, self.l.eval(model), self.r)
+
         leval = self.l.eval(model)
         
         reval = self.r.eval(model)
@@ -119,12 +265,29 @@ class ModelsOp(BinaryOp):
             return "syntax error"
         
     def eval_alt(self, model):
+        if type(self.l) == InformationStateExp and type(self.r) not in (ContextExp, InformationStateExp, ModelsOp):
+            return supports(model, self.l.eval(model), self.r)
+
         leval = self.l.eval_alt(model)
         reval = self.r.eval_alt(model)
         if (type(self.l) == InformationStateExp and type(self.r) == ContextExp) or type(self.r) == InformationStateExp:
             return "syntax error"
         return all([any([alt.issubset(x) for x in reval]) for alt in leval])
 
+    def eval_zdd(self, model, manager):
+        leval = self.l.eval_zdd(model, manager)
+        reval = self.r.eval_zdd(model, manager)
+
+        if type(leval) == frozenset:
+            if (type(self.r) == ContextExp):
+                return "syntax error"
+            return manager.contains(reval, leval)
+
+        if type(reval) == frozenset:
+            return "syntax error"
+
+        return manager.issubset(leval, reval)
+
 
 class AndOp(BinaryOp):
     """
@@ -135,12 +298,19 @@ class AndOp(BinaryOp):
 
     def eval(self, model):
         leval = self.l.eval(model)
+        if type(leval) == bool or type(leval) == str:
+            # conjunction of models checks (see optimizer), short-circuits on the first failure
+            return self.r.eval(model) if leval is True else leval
+
         reval = self.r.eval(model)
         
         return leval.intersection(reval)
     
     def eval_alt(self, model):
         leval = self.l.eval_alt(model)
+        if type(leval) == bool or type(leval) == str:
+            return self.r.eval_alt(model) if leval is True else leval
+
         reval = self.r.eval_alt(model)
         
         new_alts = set()
@@ -151,6 +321,16 @@ class AndOp(BinaryOp):
         
         return res
 
+    def eval_zdd(self, model, manager):
+        leval = self.l.eval_zdd(model, manager)
+        if type(leval) == bool or type(leval) == str:
+            return self.r.eval_zdd(model, manager) if leval is True else leval
+
+        return manager.intersection(leval, self.r.eval_zdd(model, manager))
+
+    def support(self, model, state, memo):
+        return supports(model, state, self.l, memo) and supports(model, state, self.r, memo)
+
 class InqOrOp(BinaryOp):
     """
         Implements the inquisitive or operator
@@ -171,6 +351,12 @@ class InqOrOp(BinaryOp):
         res = fn.max(leval.union(reval))
         return res
 
+    def eval_zdd(self, model, manager):
+        return manager.union(self.l.eval_zdd(model, manager), self.r.eval_zdd(model, manager))
+
+    def support(self, model, state, memo):
+        return supports(model, state, self.l, memo) or supports(model, state, self.r, memo)
+
 
 
 class OrOp(BinaryOp):
@@ -193,6 +379,19 @@ class OrOp(BinaryOp):
         res = set([frozenset(fn.info(leval).union(fn.info(reval)))])
         return res
 
+    def eval_zdd(self, model, manager):
+        leval = self.l.eval_zdd(model, manager)
+        reval = self.r.eval_zdd(model, manager)
+
+        return manager.powerset(manager.support(leval).union(manager.support(reval)))
+
+    def support(self, model, state, memo):
+        for w in state:
+            singleton = frozenset([w])
+            if not supports(model, singleton, self.l, memo) and not supports(model, singleton, self.r, memo):
+                return False
+        return True
+
 
 class ThenOp(BinaryOp):
     """
@@ -209,32 +408,31 @@ class ThenOp(BinaryOp):
                 Start gathering all possible information states (IS) and sort by length
 
                 for each IS in possible IS:
-                    if implication hold
+                    if implication holds and all IS with one world less are in the result
                     Then
                         add to result
-                        continue
-                    else
-                        remove all supersets from possible IS
-                        continue
                     endif
 
-            Note: definitely not the most efficient implementation...
+            Note: the implication condition is checked with the support checker (shared memo), so the propositions of
+                the antecedent and consequent are never computed. Still exponential in the number of worlds...
+                For large models the states are checked on a pool of worker processes when set_workers was used.
         """
+        if _workers > 1 and len(model.worlds) >= PARALLEL_MIN_WORLDS:
+            import parallel
+            return parallel.then_eval(self, model, _workers)
+
         result = set()
+        memo = dict()
         possible = sorted(list(fn.set_powerset(model.worlds)), key=lambda informationState: len(informationState)) 
-        while len(possible) > 0:
-            informationState = possible.pop(0)
+        for informationState in possible:
             
-            # handles empty information states
-            if len(informationState) == 0:
-                result.add(informationState)
+            # supersets of states that fail the implication fail it as well
+            if not all([informationState.difference([w]) in result for w in informationState]):
                 continue
 
             # check implication condition:
-            if not ModelsOp(InformationStateExp(None, informationState), self.l).eval(model) or ModelsOp(InformationStateExp(None, informationState), self.r).eval(model):
+            if not supports(model, informationState, self.l, memo) or supports(model, informationState, self.r, memo):
                 result.add(informationState)
-            else:
-                possible = [x for x in possible if not informationState.issubset(x)] # trim possible information states
 
         return result
 
@@ -242,6 +440,10 @@ class ThenOp(BinaryOp):
         reval = self.r.eval_alt(model)
         leval = self.l.eval_alt(model)
 
+        if _workers > 1 and len(reval) ** len(leval) >= PARALLEL_MIN_CHOICES:
+            import parallel
+            return parallel.then_eval_alt(model, _workers, leval, reval)
+
         l = len(leval)
         func_res = list(itertools.product(reval, repeat = l))
 
@@ -258,6 +460,24 @@ class ThenOp(BinaryOp):
 
         return alt_res
 
+    def eval_zdd(self, model, manager):
+        return manager.implication(self.l.eval_zdd(model, manager), self.r.eval_zdd(model, manager))
+
+    def support(self, model, state, memo):
+        """
+            Supported iff every substate supporting the antecedent supports the consequent.
+            By persistence the check can stop as soon as the state itself supports the consequent,
+            otherwise the substates are visited lazily one world less at a time (memoized).
+        """
+        if supports(model, state, self.r, memo):
+            return True
+        if supports(model, state, self.l, memo):
+            return False
+        for w in state:
+            if not supports(model, state.difference([w]), self, memo):
+                return False
+        return True
+
 
 
 
@@ -275,7 +495,16 @@ class ContextExp(VariableExp):
         return model.context
 
     def eval_alt(self, model):
-        return fn.alternatives(model.context)
+        return model.context_alternatives()
+
+    def eval_zdd(self, model, manager):
+        res = 0
+        for alternative in model.context_alternatives():
+            res = manager.union(res, manager.powerset(alternative))
+        return res
+
+    def support(self, model, state, memo):
+        return model.in_context(state)
 
 class PropExp(VariableExp):
     """
@@ -287,11 +516,18 @@ class PropExp(VariableExp):
     def __str__(self):
         return str(self.name)
     
+    # atoms that are not in the valuation are true nowhere, looking them up must not add them (versions share the valuation)
     def eval(self, model):
-        return fn.set_powerset(model.valuation[self.name])
+        return fn.set_powerset(model.valuation.get(self.name, set()))
 
     def eval_alt(self, model):
-        return set([frozenset(model.valuation[self.name])])
+        return set([frozenset(model.valuation.get(self.name, set()))])
+
+    def eval_zdd(self, model, manager):
+        return manager.powerset(model.valuation.get(self.name, set()))
+
+    def support(self, model, state, memo):
+        return state.issubset(model.valuation.get(self.name, set()))
 
 class InformationStateExp(VariableExp):
     """
@@ -317,6 +553,12 @@ class InformationStateExp(VariableExp):
     def eval_alt(self, model):
         return set([self.eval(model)])
 
+    def eval_zdd(self, model, manager):
+        return self.eval(model)
+
+    def support(self, model, state, memo):
+        return state.issubset(self.eval(model))
+
 if __name__ == "__main__":
     e1 = ModelsOp(ContextExp('C'), AndOp(PropExp('p'), PropExp('q')))
     e2 = WhetherOp(PropExp('q'))
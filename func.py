@@ -79,6 +79,56 @@ def info(iterable):
     return buf
 
 
+def bits(mask):
+    """
+        Yields the indices of the set bits of a bitmask (an information state encoded as an integer)
+
+        bits(0b1011) --> 0, 1, 3
+    """
+    # scanning the binary string is linear in the width, peeling off the lowest bit would be quadratic for wide masks
+    digits = bin(mask)[:1:-1]
+    i = digits.find("1")
+    while i != -1:
+        yield i
+        i = digits.find("1", i + 1)
+
+def submasks(mask):
+    """
+        Yields all submasks of a bitmask in increasing order, i.e. the powerset of an information state encoded as an integer
+
+        submasks(0b101) --> 0b000, 0b001, 0b100, 0b101
+    """
+    sub = 0
+    while True:
+        yield sub
+        if sub == mask:
+            return
+        sub = (sub - mask) & mask
+
+def maximal_masks(masks):
+    """
+        Returns the antichain (list) of maximal bitmasks, i.e. the alternatives of the downward closure of the masks.
+
+        Note: a mask which has a superset with a single extra bit among the masks is certainly not maximal, which is a cheap
+            first filter when the masks are (close to) downward closed. The remaining candidates are compared pairwise.
+    """
+    masks = set(masks)
+    universe = 0
+    for m in masks:
+        universe |= m
+
+    if len(masks) > universe.bit_length():
+        candidates = [m for m in masks if not any([(m | (1 << i)) in masks for i in bits(universe & ~m)])]
+    else:
+        candidates = list(masks)
+
+    candidates.sort(key=lambda m: -bin(m).count("1"))
+    res = []
+    for m in candidates:
+        if all([(m & ~a) != 0 for a in res]):
+            res.append(m)
+    return res
+
 def powerset(seq):
     """
         Alternative powerset function; not used
@@ -0,0 +1,237 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import argparse
+import json
+import random
+import sys
+import time
+from copy import deepcopy
+
+import backends
+import expressions as exp
+from InquisitiveLogicModelChecker import Model
+
+
+# Differential fuzzing of the evaluation backends (see backends.py) against the reference semantics ("eval").
+#
+# Models are kept as plain descriptions ({"worlds": {world: atoms}, "context": [states], "information_states": {name: state}})
+# so that they can be shrunk easily, a fresh Model is built from the description for every evaluation.
+# Every backend also gets a fresh copy of the formula, information state expressions remember the state they evaluated to.
+
+ATOMS = ("p", "q", "r")
+UNARY = (exp.NotOp, exp.WhetherOp)
+BINARY = (exp.AndOp, exp.InqOrOp, exp.OrOp, exp.ThenOp)
+
+def random_formula(rnd, depth):
+    """Random sentence over the atoms and the context, with at most depth nested operators"""
+    if depth == 0 or rnd.random() < 0.25:
+        if rnd.random() < 0.1:
+            return exp.ContextExp("C")
+        return exp.PropExp(rnd.choice(ATOMS))
+
+    cls = rnd.choice(UNARY + BINARY)
+    if cls in UNARY:
+        return cls(random_formula(rnd, depth - 1))
+    return cls(random_formula(rnd, depth - 1), random_formula(rnd, depth - 1))
+
+def random_case(rnd, max_worlds, depth):
+    n = rnd.randint(1, max_worlds)
+    worlds = dict([("w" + str(i), sorted(rnd.sample(ATOMS, rnd.randint(0, len(ATOMS))))) for i in range(n)])
+    names = sorted(worlds.keys())
+    description = {
+        "worlds": worlds,
+        "context": [sorted(rnd.sample(names, rnd.randint(0, n))) for i in range(rnd.randint(1, 3))],
+        "information_states": {"s": sorted(rnd.sample(names, rnd.randint(0, n)))}}
+
+    formula = random_formula(rnd, depth)
+    if rnd.random() < 0.2:
+        formula = exp.ModelsOp(rnd.choice([exp.ContextExp("C"), exp.InformationStateExp("s")]), formula)
+    return formula, description
+
+def build(description):
+    model = Model()
+    for world, atoms in sorted(description["worlds"].items()):
+        model.add_world(world, *atoms)
+    model.set_context(description["context"])
+    for name, state in description["information_states"].items():
+        model.add_information_state(name, tuple(state))
+    return model
+
+def run(formula, description, names):
+    """Evaluates the case with every backend, returns the results and the timings (in seconds) per backend"""
+    results = dict()
+    timings = dict()
+    for name in names:
+        model = build(description)
+        copy = deepcopy(formula)
+        start = time.perf_counter()
+        try:
+            results[name] = backends.get(name)(copy, model)
+        except Exception as e:
+            results[name] = "exception: " + repr(e)
+        timings[name] = time.perf_counter() - start
+    return results, timings
+
+def fails(formula, description, name):
+    results = run(formula, description, ["eval", name])[0]
+    return results["eval"] != results[name]
+
+
+def formula_candidates(formula):
+    """Smaller formulas: every subformula replaced by one of its children or by an atom"""
+    if isinstance(formula, exp.VariableExp):
+        if type(formula) != exp.PropExp or formula.name != ATOMS[0]:
+            yield exp.PropExp(ATOMS[0])
+        return
+
+    if type(formula) == exp.ModelsOp:
+        yield formula.r
+        for r in formula_candidates(formula.r):
+            yield exp.ModelsOp(formula.l, r)
+        return
+
+    if isinstance(formula, exp.UnaryOp):
+        yield formula.r
+        for r in formula_candidates(formula.r):
+            yield type(formula)(r)
+        return
+
+    yield formula.l
+    yield formula.r
+    yield exp.PropExp(ATOMS[0])
+    for l in formula_candidates(formula.l):
+        yield type(formula)(l, formula.r)
+    for r in formula_candidates(formula.r):
+        yield type(formula)(formula.l, r)
+
+def model_candidates(description):
+    """Smaller models: a world, an atom of a world, a context state or a world of a state removed"""
+    def without_world(states, world):
+        return [[w for w in state if w != world] for state in states]
+
+    for world in sorted(description["worlds"]):
+        res = deepcopy(description)
+        del res["worlds"][world]
+        res["context"] = without_world(res["context"], world)
+        for name, state in res["information_states"].items():
+            res["information_states"][name] = [w for w in state if w != world]
+        yield res
+
+    for world, atoms in sorted(description["worlds"].items()):
+        for atom in atoms:
+            res = deepcopy(description)
+            res["worlds"][world] = [a for a in atoms if a != atom]
+            yield res
+
+    for i, state in enumerate(description["context"]):
+        if len(description["context"]) > 1:
+            res = deepcopy(description)
+            del res["context"][i]
+            yield res
+        for world in state:
+            res = deepcopy(description)
+            res["context"][i] = [w for w in state if w != world]
+            yield res
+
+    for name, state in sorted(description["information_states"].items()):
+        for world in state:
+            res = deepcopy(description)
+            res["information_states"][name] = [w for w in state if w != world]
+            yield res
+
+def shrink(formula, description, name):
+    """Greedily shrinks the formula and the model as long as backend name still disagrees with eval"""
+    progress = True
+    while progress:
+        progress = False
+        for candidate in formula_candidates(formula):
+            if fails(candidate, description, name):
+                formula, progress = candidate, True
+                break
+        if progress:
+            continue
+        for candidate in model_candidates(description):
+            if fails(formula, candidate, name):
+                description, progress = candidate, True
+                break
+    return formula, description
+
+
+def fuzz(cases=100, seed=0, max_worlds=4, depth=4, names=None, log=print):
+    """
+        Runs random cases through all (or the given) backends.
+        Returns the list of (shrunk) mismatches and the timings of every case.
+    """
+    rnd = random.Random(seed)
+    names = ["eval"] + [name for name in (names or backends.names()) if name != "eval"]
+    mismatches = []
+    timings = []
+
+    for case in range(cases):
+        formula, description = random_case(rnd, max_worlds, depth)
+        results, times = run(formula, description, names)
+        timings.append({"case": case, "formula": str(formula), "worlds": len(description["worlds"]), "timings": times})
+
+        for name in names[1:]:
+            if results[name] != results["eval"]:
+                small, model = shrink(formula, description, name)
+                res = run(small, model, ["eval", name])[0]
+                mismatches.append({"case": case, "backend": name, "formula": str(small), "model": model,
+                                   "expected": str(res["eval"]), "got": str(res[name])})
+                log("mismatch in case " + str(case) + " (" + name + "): " + json.dumps(mismatches[-1]))
+
+    return mismatches, timings
+
+def summary(timings):
+    """Total, mean and maximum time (ms) per backend"""
+    lines = []
+    for name in timings[0]["timings"] if len(timings) > 0 else []:
+        times = [t["timings"][name] * 1000 for t in timings]
+        lines.append("%-14s total %10.1f ms  mean %8.2f ms  max %8.2f ms" % (name, sum(times), sum(times) / len(times), max(times)))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Differential fuzzing of the evaluation backends against eval")
+    parser.add_argument("--cases", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worlds", type=int, default=4, help="maximum number of worlds of the random models")
+    parser.add_argument("--depth", type=int, default=4, help="maximum nesting of operators of the random formulas")
+    parser.add_argument("--backends", default=None, help="comma separated backends to check (default: all registered)")
+    parser.add_argument("--timings", default=None, help="writes the timings of every case to this json file")
+    args = parser.parse_args()
+
+    # the persistent cache would hide differences between the backends
+    exp.set_cache(None)
+    mismatches, timings = fuzz(args.cases, args.seed, args.worlds, args.depth, args.backends.split(",") if args.backends else None)
+
+    print(summary(timings))
+    if args.timings is not None:
+        with open(args.timings, "w") as f:
+            json.dump(timings, f, indent=1)
+    print(str(len(mismatches)) + " mismatch(es) in " + str(args.cases) + " cases")
+    sys.exit(1 if len(mismatches) > 0 else 0)
@@ -0,0 +1,132 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+from collections import Counter
+
+import expressions as exp
+from optimizer import children, post_order
+
+
+# Incremental maintenance of the results of a standing set of formulas over a model that changes.
+#
+# Every node of a subscribed formula records the components of the model it depends on (its own and those of its
+# subformulas): ("atom", p), ("worlds",), ("context",) or ("state", name). The results of all nodes are stored, a change
+# of the model only drops the stored results of the nodes that depend on a touched component. The next evaluation
+# recomputes those nodes bottom-up and takes the results of all other subformulas from the store.
+
+def own_dependencies(node):
+    """The components of the model that the evaluation of the node itself (not its subformulas) reads"""
+    if type(node) == exp.PropExp:
+        return [("atom", node.name)]
+    if type(node) == exp.ContextExp:
+        return [("context",)]
+    if type(node) == exp.InformationStateExp:
+        return [("state", node.name)]
+    if type(node) in (exp.NotOp, exp.WhetherOp, exp.ThenOp):
+        # these take the complement of an informative content or sweep all information states
+        return [("worlds",)]
+    return []
+
+
+class Monitor():
+    """
+        Keeps the results of subscribed formulas up to date with a model that is changed in place (add_world, remove_world,
+        set_context, ...), recomputing only the subformulas that a change can affect.
+
+        Note: the monitor follows the model it was created with, versions made with fork or update are not followed.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.subscriptions = dict() # id -> (formula, mode)
+        self.next_id = 0
+        self.nodes = Counter()      # node -> number of subscriptions containing it
+        self.dependents = dict()    # component -> set of nodes depending on it (also through subformulas)
+        self.dependencies = dict()  # node -> set of components
+        self.named = set()          # information state nodes that look up their state in the model
+        self.results = dict()       # (node, mode) -> result
+        self.recomputed = 0
+        model.observe(self.changed)
+
+    def close(self):
+        """Stops following the model"""
+        self.model.unobserve(self.changed)
+
+    def subscribe(self, formula, mode="eval"):
+        """Registers the formula (mode is "eval" or "eval_alt"), returns the id of the subscription"""
+        for node in post_order(formula):
+            self.nodes[node] += 1
+            if self.nodes[node] > 1:
+                continue
+
+            components = set(own_dependencies(node))
+            for child in children(node):
+                components.update(self.dependencies[child])
+            self.dependencies[node] = components
+            for component in components:
+                self.dependents.setdefault(component, set()).add(node)
+            if type(node) == exp.InformationStateExp and node.informationState is None:
+                self.named.add(node)
+
+        self.next_id += 1
+        self.subscriptions[self.next_id] = (formula, mode)
+        return self.next_id
+
+    def unsubscribe(self, subscription):
+        formula, mode = self.subscriptions.pop(subscription)
+        for node in post_order(formula):
+            self.nodes[node] -= 1
+            if self.nodes[node] > 0:
+                continue
+
+            del self.nodes[node]
+            for component in self.dependencies.pop(node):
+                self.dependents[component].discard(node)
+            self.named.discard(node)
+            for key in [(node, "eval"), (node, "eval_alt")]:
+                self.results.pop(key, None)
+
+    def changed(self, components):
+        """Observer of the model: drops the stored results of all nodes depending on the touched components"""
+        for component in components:
+            for node in self.dependents.get(component, ()):
+                if node in self.named:
+                    # information state expressions remember the state they evaluated to
+                    node.informationState = None
+                self.results.pop((node, "eval"), None)
+                self.results.pop((node, "eval_alt"), None)
+
+    def result(self, subscription):
+        """The current result of the subscribed formula, only the subformulas affected by changes are recomputed"""
+        formula, mode = self.subscriptions[subscription]
+        before = len(self.results)
+        with exp.stored_results(self.nodes, self.results):
+            res = getattr(formula, mode)(self.model)
+        self.recomputed += len(self.results) - before
+        return res
+
+    def all_results(self):
+        """The current results of all subscriptions"""
+        return dict([(subscription, self.result(subscription)) for subscription in self.subscriptions])
@@ -0,0 +1,166 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import expressions as exp
+import func as fn
+from optimizer import children, post_order
+
+
+# Evaluation and printing of (very) deep formulas with an explicit stack instead of recursion.
+#
+# The nodes are visited in post-order. Every node is evaluated by its own eval/eval_alt within
+# expressions.stored_results, so it gets the results of its subformulas without descending into them. Only the
+# implication and the support check of |= (which use the recursive support checker) are computed here from the results of
+# their subformulas. Structurally equal subtrees share one result, results are dropped once all parents have been computed.
+
+# formulas up to this depth are evaluated recursively by dispatch, which is faster for shallow formulas (see bench_depth.py)
+RECURSIVE_MAX_DEPTH = 100
+
+# (prefix, infix, suffix) of the string of every operator, as printed by the __str__ methods
+FORMATS = {
+    exp.WhetherOp: ("?(", None, ")"),
+    exp.NotOp: ("not(", None, ")"),
+    exp.ModelsOp: ("", " |= ", ""),
+    exp.AndOp: ("(", " and ", ")"),
+    exp.InqOrOp: ("(", " or ", ")"),
+    exp.OrOp: ("(", " or ", ")"),
+    exp.ThenOp: ("(", " -> ", ")"),
+}
+
+def to_string(tree):
+    """
+        Returns str(tree). The pieces are emitted in order from an explicit stack and joined once
+        (building the string of every subformula would take time quadratic in the depth).
+    """
+    pieces = []
+    stack = [tree]
+    while len(stack) > 0:
+        item = stack.pop()
+        if type(item) == str:
+            pieces.append(item)
+        elif type(item) not in FORMATS:
+            pieces.append(str(item))
+        else:
+            prefix, infix, suffix = FORMATS[type(item)]
+            kids = children(item)
+            stack.append(suffix)
+            stack.append(kids[-1])
+            if infix is not None:
+                stack.append(infix)
+                stack.append(kids[0])
+            stack.append(prefix)
+    return "".join(pieces)
+
+def depth(tree):
+    """Returns the number of nested operators of the formula"""
+    depths = dict()
+    for node in post_order(tree):
+        depths[node] = 1 + max([depths[c] for c in children(node)], default=-1)
+    return depths[tree]
+
+
+def structure_keys(order):
+    """Returns a key for every node (given in post-order) such that nodes have equal keys iff their subtrees are equal"""
+    keys = dict()
+    table = dict()
+    for node in order:
+        if type(node) == exp.InformationStateExp:
+            state = node.informationState
+            key = (type(node), node.name, None if state is None else frozenset(state))
+        elif isinstance(node, exp.VariableExp):
+            key = (type(node), node.name)
+        else:
+            key = (type(node),) + tuple([keys[c] for c in children(node)])
+        keys[node] = table.setdefault(key, len(table))
+    return keys
+
+def then_eval(model, leval, reval):
+    """ThenOp.eval from the propositions of the antecedent and the consequent (a state supports them iff it is in them)"""
+    result = set()
+    for informationState in sorted(fn.set_powerset(model.worlds), key=len):
+        if not all([informationState.difference([w]) in result for w in informationState]):
+            continue
+        if informationState not in leval or informationState in reval:
+            result.add(informationState)
+    return result
+
+def support_eval(model, state, reval, mode):
+    """|= with an information state on the left, from the result of the right hand side"""
+    if mode == "eval":
+        return state in reval
+    return any([state.issubset(alternative) for alternative in reval])
+
+def evaluate(tree, model, mode="eval", *args):
+    """
+        Evaluates the formula like tree.eval(model) (or tree.eval_alt(model) for mode "eval_alt") in constant python stack.
+        The args are passed on to every eval method, e.g. the manager for mode "eval_zdd".
+    """
+    if not isinstance(tree, exp.Expression):
+        return tree
+
+    order = list(post_order(tree))
+    keys = structure_keys(order)
+    parents = dict() # key -> number of parents (of distinct structure) that still need the result
+    counted = set()
+    for node in order:
+        if keys[node] in counted:
+            continue
+        counted.add(keys[node])
+        for c in set([keys[c] for c in children(node)]):
+            parents[c] = parents.get(c, 0) + 1
+
+    # the implications evaluated in parallel share one pool of workers (see expressions.worker_pool)
+    with exp.worker_pool(model):
+        results = dict()
+        for node in order:
+            key = keys[node]
+            if key in results:
+                continue
+
+            kids = children(node)
+            if type(node) == exp.ThenOp and mode == "eval":
+                res = then_eval(model, results[keys[node.l]], results[keys[node.r]])
+            elif type(node) == exp.ModelsOp and mode in ("eval", "eval_alt") and type(node.l) == exp.InformationStateExp \
+                    and type(node.r) not in (exp.ContextExp, exp.InformationStateExp, exp.ModelsOp):
+                res = support_eval(model, node.l.eval(model), results[keys[node.r]], mode)
+            else:
+                stored = dict([((c, mode), results[keys[c]]) for c in kids])
+                with exp.stored_results(set(kids), stored):
+                    res = getattr(node, mode)(model, *args)
+            results[key] = res
+
+            for c in set([keys[c] for c in kids]):
+                parents[c] -= 1
+                if parents[c] == 0:
+                    del results[c]
+
+    return results[keys[tree]]
+
+def dispatch(tree, model, mode="eval", *args):
+    """Evaluates the formula recursively, or with evaluate when it is nested more than RECURSIVE_MAX_DEPTH operators deep"""
+    if isinstance(tree, exp.Expression) and depth(tree) > RECURSIVE_MAX_DEPTH:
+        return evaluate(tree, model, mode, *args)
+    return getattr(tree, mode)(model, *args)
@@ -25,9 +25,18 @@
 # Korijn Moor
 
 import os
-import func
+import sys
+import expressions
+import iterative
 from InquisitiveLogicModelChecker import Model
 from ILL_parser import parse
+from optimizer import optimize
+
+# Note: the backends (zdd, entailment/sat, the cache and parallel) are imported by the commands that use them,
+#   so that a prompt or a one-shot "check" does not pay for modules it never touches (see bench_startup.py).
+
+# results of (ez) and (eo) with more states are summarized instead of printed
+PRINT_LIMIT = 1000
 
 class App():
 
@@ -43,17 +52,32 @@ class App():
             'h': self.help_func,
             's': self.save_func,
             'l': self.load_func,
+            'lt': self.load_table_func,
             'i': self.ignorant_func,
             'c': self.set_context_func,
             'is': self.add_information_state_func,
             'r': self.reset_func,
             'u': self.update_func,
+            'b': self.back_func,
             'e': self.eval_func,
-            'ea': self.eval_alt_func}
+            'ea': self.eval_alt_func,
+            'ez': self.eval_zdd_func,
+            'ep': self.eval_planned_func,
+            'eo': self.eval_out_of_core_func,
+            'explain': self.explain_func,
+            'n': self.count_func,
+            'ce': self.countermodel_func,
+            'opt': self.optimize_func,
+            'cache': self.cache_func,
+            'j': self.workers_func}
 
         self.model = Model()
         self.variables = dict()
 
+        # nightly jobs can enable the persistent evaluation cache without entering commands
+        if os.environ.get("INQUISITIVE_CACHE_DIR"):
+            self.cache_func(os.environ["INQUISITIVE_CACHE_DIR"])
+
     def handle_input(self):
         args = self.curr_input.split()
         if len(args) == 0:
@@ -68,6 +92,8 @@ class App():
             print("index error")
         except FileNotFoundError as e:
             print("file location invalid")
+        except RecursionError as e:
+            print("sentence nested too deeply for this command")
 
     def reset_func(self):
         self.model = Model()
@@ -97,6 +123,9 @@ class App():
     def load_func(self, *args):
         self.model = Model.load(args[0])
 
+    def load_table_func(self, *args):
+        self.model = Model.from_truth_table(args[0])
+
     def ignorant_func(self, *args):
         self.model.set_ignorant()
 
@@ -130,7 +159,14 @@ class App():
         for el in args:
             string += " " + el
         string = string.strip()
-        self.model.update_context(parse(string))
+        self.model = self.model.update(optimize(parse(string))[0])
+
+    def back_func(self, *args):
+        """Returns to the model before the last update(s), args[0] is the number of updates (default 1)"""
+        try:
+            self.model = self.model.rollback(int(args[0]) if len(args) > 0 else 1)
+        except ValueError:
+            print("no earlier update")
 
     def eval_func(self, *args):
         """
@@ -142,8 +178,8 @@ class App():
             string += " " + el
         string = string.strip()
         
-        tree = parse(string)
-        print(tree.eval(self.model))
+        tree, removed = optimize(parse(string))
+        print(iterative.dispatch(tree, self.model))
 
     def eval_alt_func(self, *args):
 
@@ -153,11 +189,151 @@ class App():
 
         string = string.strip()
 
-        tree = parse(string)
-        print(tree.eval_alt(self.model))
+        tree, removed = optimize(parse(string))
+        print(iterative.dispatch(tree, self.model, "eval_alt"))
 
         # implemented, but at what cost? No really, the implementations do not seem to be efficient at all...
 
+    def eval_zdd_func(self, *args):
+        """
+            Evaluate the given string with the symbolic (ZDD) backend.
+            Note: results with at most PRINT_LIMIT states are printed like the eval function prints them, larger ones
+            by their numbers of states and alternatives.
+        """
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        import zdd
+        tree, removed = optimize(parse(string))
+        print(zdd.summary(tree, self.model, PRINT_LIMIT))
+
+    def eval_out_of_core_func(self, *args):
+        """
+            Evaluate the given string with propositions stored on disk when they are large (see outofcore.py).
+            Note: only results with at most PRINT_LIMIT states are printed in full.
+        """
+        import outofcore
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        tree, removed = optimize(parse(string))
+        res = outofcore.evaluate(tree, self.model) if isinstance(tree, expressions.Expression) else tree
+        if not isinstance(res, outofcore.DiskProposition):
+            print(res)
+            return
+        with res:
+            print(set(res) if len(res) <= PRINT_LIMIT else res)
+
+    def eval_planned_func(self, *args):
+        """
+            Evaluate the given string with the cheapest mix of eval and eval_alt (see planner.py).
+            Note: the result is printed as alternatives, like the eval alternative function prints it.
+        """
+        import planner
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        tree, removed = optimize(parse(string))
+        print(planner.evaluate(tree, self.model))
+
+    def explain_func(self, *args):
+        """Prints the plan (the strategy and estimated cost of every subformula) that (ep) would use for the given string"""
+        import planner
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        tree, removed = optimize(parse(string))
+        if not isinstance(tree, expressions.Expression):
+            print(tree)
+            return
+        print(planner.plan(tree, self.model, "alt").explain())
+
+    def count_func(self, *args):
+        """Prints the number of information states supporting the given string and its number of alternatives, or those of the context"""
+        import counting
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        if string == "":
+            print("states: " + str(counting.count_context(self.model)) + ", alternatives: " + str(len(self.model.context_masks())))
+            return
+
+        tree, removed = optimize(parse(string))
+        states = counting.count_states(tree, self.model) if isinstance(tree, expressions.Expression) else tree
+        if type(states) != int:
+            print("only sentences have supporting states")
+            return
+        print("states: " + str(states) + ", alternatives: " + str(counting.count_alternatives(tree, self.model)))
+
+    def countermodel_func(self, *args):
+        """
+            Searches for a countermodel of the entailment "premise entails conclusion" (with at most 6 worlds).
+            Note: only propositional formulas are supported (no contexts, information states or models).
+        """
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        string = " " + string + " "
+        if " entails " not in string:
+            print("syntax error")
+            return
+        premise, conclusion = string.split(" entails ", 1)
+
+        import entailment
+        try:
+            model = entailment.find_countermodel(parse(premise.strip()), parse(conclusion.strip()))
+        except ValueError as e:
+            # contexts, information states and models cannot be encoded
+            print(e)
+            return
+        if model is None:
+            print("no countermodel with at most 6 worlds")
+        else:
+            print(model)
+
+    def optimize_func(self, *args):
+        """Prints the rewritten sentence that is actually evaluated and the number of nodes the rewriting removed"""
+        string = ""
+        for el in args:
+            string += " " + el
+        string = string.strip()
+
+        tree, removed = optimize(parse(string))
+        print(iterative.to_string(tree))
+        print("nodes removed: " + str(removed))
+
+    def cache_func(self, *args):
+        """Enables the persistent evaluation cache in directory args[0], disables it with "off" or prints its statistics"""
+        if len(args) == 0:
+            print(expressions._cache if expressions._cache is not None else "cache disabled")
+        elif args[0] == "off":
+            expressions.set_cache(None)
+        else:
+            from cache import EvaluationCache
+            expressions.set_cache(EvaluationCache(args[0]))
+
+    def workers_func(self, *args):
+        """Sets the number of processes used for implications, args[0] defaults to the number of cpus"""
+        try:
+            workers = int(args[0]) if len(args) > 0 else (os.cpu_count() or 1)
+        except ValueError:
+            print("usage: j [number of processes]")
+            return
+        expressions.set_workers(workers)
+        print("using " + str(max(1, workers)) + " process(es) for implications")
+
     def help_func(self):
         """Display "help" message, in quotes because it is not quite explanatory"""
         help_message = \
@@ -175,6 +351,11 @@ Main model creation functions:
 (s)ave [x]: saves model to location x
 (l)oad [x]: loads model from location x
     x specifies a path    
+(lt) load table [x]: loads the worlds and valuation from the csv truth table at location x
+    Note: the header row should hold the atoms and the first column the world names, e.g.:
+    world,p,q
+    w1,1,0
+    w2,0,1
 
 (r)eset: reset model
 
@@ -220,10 +401,35 @@ Contexts:
     Note: One should first specify all worlds with the add function, since during interpreting the context all information states wich contain non-existing worlds will be pruned.
 
 (u)pdate [s]: update context model with the sentence s
+(b)ack [n]: undo the last n updates (default 1), at most the last 100 updates can be undone
+    Note: this returns to the model as it was before those updates, so other changes made since then are undone as well.
 
 
 (e)val [s]: evaluates sentence s
 (ea) eval alternative [s]: experimental method of evaluation using only alternatives instead of full propositions. This is functional and (hopefully) correct.
+    Note: sentences nested more than 100 operators deep are evaluated (and printed by (opt)) without recursion, see iterative.py.
+    This holds for (u), (ez), (eo), (ep) and (n) as well.
+(ez) eval zdd [s]: evaluates sentence s with propositions represented as shared decision diagrams (ZDDs). 
+    This scales to models with many worlds as long as the propositions have a compact structure.
+    Results with more than 1000 states are printed by their numbers of states and alternatives.
+(eo) eval out of core [s]: evaluates sentence s like (e), but large propositions are kept in files on disk instead of in memory.
+    Note: results with more than 1000 states are summarized by their number of states.
+(ep) eval planned [s]: evaluates sentence s choosing between (e) and (ea) for every subformula by their estimated cost, 
+    the result is printed like (ea) prints it.
+(explain) [s]: prints the plan of (ep) for sentence s: the strategy and estimated cost (in seconds) of every subformula.
+    Note: "python planner.py" measures the cost constants on this machine and stores them in planner_stats.json.
+(n) number [s]: prints the number of information states that support sentence s and the number of its alternatives,
+    without computing them. Without s it prints the numbers of the context. 
+    Note: "n C and s" gives the numbers of the context after an update with s.
+(opt) optimize [s]: prints the rewritten (simplified) sentence s and the number of removed nodes.
+    Note: all sentences are rewritten like this before they are evaluated, e.g. not not p becomes p.
+(cache) [x]: stores all results of (e)val and (ea) in a persistent cache in directory x, which can be shared between runs and processes
+    Note: "cache off" disables the cache, "cache" prints its statistics. 
+    The cache can also be enabled by setting the environment variable INQUISITIVE_CACHE_DIR.
+(j) [n]: evaluates implications on large models with n processes (default: the number of cpus), "j 1" turns this off.
+    Note: this only pays off for models with at least 12 worlds, smaller implications are always evaluated in this process.
+(ce) countermodel [s] entails [t]: searches (with a SAT solver) for a model with at most 6 worlds where 
+    the information state "s" supports sentence s but not sentence t. 
 
 Language specification:
 
@@ -260,7 +466,59 @@ Language specification:
             self.get_input()
             self.handle_input()
 
+def check(argv):
+    """
+        One-shot mode: evaluates a single sentence on a saved model and exits, e.g.
+            python main.py check --model m.p --formula "C models ?p"
+        The exit status is 0 when the result is true (or a proposition), 1 when it is false, 2 on a syntax error and 3 when
+        the model cannot be read or the backend is unknown.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py check", description="Evaluates a sentence on a model and exits")
+    parser.add_argument("--model", required=True, help="model saved with (s)ave, or a csv truth table (.csv)")
+    parser.add_argument("--formula", required=True, help="the sentence to evaluate")
+    parser.add_argument("--alt", action="store_true", help="evaluate with eval_alt (prints the alternatives)")
+    parser.add_argument("--backend", default=None, help="evaluate with a registered backend (see backends.py), e.g. zdd")
+    args = parser.parse_args(argv)
+
+    app = App()
+    try:
+        if args.model.endswith(".csv"):
+            app.model = Model.from_truth_table(args.model)
+        else:
+            app.model = Model.load(args.model)
+    except (OSError, ValueError, KeyError) as e:
+        # missing or unreadable files, malformed json or tables
+        print("cannot read model " + args.model + ": " + str(e), file=sys.stderr)
+        return 3
+
+    try:
+        tree = parse(args.formula)
+    except (IndexError, TypeError):
+        # the parser fails on unbalanced parentheses and operators without operands
+        print("syntax error")
+        return 2
+    tree, removed = optimize(tree)
+    if args.backend is not None:
+        import backends
+        try:
+            backend = backends.get(args.backend)
+        except KeyError as e:
+            print(e.args[0], file=sys.stderr)
+            return 3
+        result = backend(tree, app.model)
+    else:
+        result = iterative.dispatch(tree, app.model, "eval_alt" if args.alt else "eval")
+
+    print(result)
+    if type(result) == str:
+        return 2
+    return 1 if result is False else 0
+
 if __name__ == "__main__":
     # This is the actual code that (should) run.
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        sys.exit(check(sys.argv[2:]))
+
     app = App()
     app.mainloop()
@@ -0,0 +1,226 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import expressions as exp
+
+
+# Semantics preserving rewrites of formulas, applied between parsing and evaluation.
+#
+# Rewrite rules (where a, b are declarative formulas and x, y, z arbitrary formulas):
+#   not not a           -->  a
+#   ? ? x               -->  ? x
+#   ? not a             -->  ? a
+#   x and x, x ior x    -->  x                    a or a  -->  a
+#   x and (x ior y)     -->  x                    x and (x or y)  -->  x
+#   x ior (x and y)     -->  x
+#   x or (x ior y)      -->  x or y               x or (x or y)   -->  x or y
+#   (not not x) or y    -->  x or y               (only the informative content of disjuncts of "or" matters)
+#   a then b            -->  not a or b
+#   a then (x ior y)    -->  (a then x) ior (a then y)
+#   a then ? x          -->  (a then x) ior (a then not x)
+#   C models (x and y)  -->  (C models x) and (C models y)
+#
+# The antecedent of a declarative implication has a single alternative, so the implication distributes over the
+# alternatives of its consequent. The parts are cheaper: they become "not a or b" when they are declarative.
+# "or" over "ior" is only collapsed when they share a disjunct. Rewriting (x ior y) or z to (x or y) or z keeps the
+# meaning, but the inner "or" then evaluates to the powerset of its informative content instead of a union of two propositions.
+
+def children(node):
+    if isinstance(node, exp.UnaryOp):
+        return [node.r]
+    if isinstance(node, exp.BinaryOp):
+        return [node.l, node.r]
+    return []
+
+def post_order(tree):
+    """Yields the nodes of the formula in post-order (subformulas first), every (shared) node once"""
+    seen = set()
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack[-1]
+        pending = [c for c in children(node) if c not in seen]
+        if len(pending) > 0:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        if node not in seen:
+            seen.add(node)
+            yield node
+
+def size(tree):
+    """Returns the number of nodes of the formula (shared subformulas are counted once for every occurrence)"""
+    sizes = dict()
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack[-1]
+        pending = [c for c in children(node) if id(c) not in sizes]
+        if len(pending) > 0:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        sizes[id(node)] = 1 + sum([sizes[id(c)] for c in children(node)])
+    return sizes[id(tree)]
+
+
+class Optimizer():
+    """
+        Rebuilds a formula bottom-up, applying the rewrite rules every time a node is constructed.
+
+        Note: nodes are hash-consed (structurally equal subformulas become the same object), so checking the rules
+            only takes constant time per node and the children of every constructed node are already in normal form.
+            Hence a single pass reaches the fixpoint, in time linear in the size of the formula.
+    """
+    def __init__(self):
+        self.table = dict()
+        self.declarative = dict()
+        self.rewrites = 0
+
+    def is_declarative(self, node):
+        return self.declarative.get(id(node), False)
+
+    def leaf(self, node):
+        if type(node) == exp.InformationStateExp:
+            state = node.informationState
+            key = (type(node), node.name, None if state is None else frozenset(state))
+        elif type(node) in (exp.PropExp, exp.ContextExp):
+            key = (type(node), node.name)
+        else:
+            key = (type(node), id(node))
+
+        if key not in self.table:
+            self.table[key] = node
+            self.declarative[id(node)] = type(node) == exp.PropExp
+        return self.table[key]
+
+    def node(self, cls, args):
+        key = (cls,) + tuple([id(a) for a in args])
+        if key not in self.table:
+            node = cls(*args)
+            self.table[key] = node
+            if cls in (exp.NotOp, exp.OrOp):
+                self.declarative[id(node)] = True
+            elif cls == exp.AndOp:
+                self.declarative[id(node)] = self.is_declarative(args[0]) and self.is_declarative(args[1])
+            elif cls == exp.ThenOp:
+                self.declarative[id(node)] = self.is_declarative(args[1])
+        return self.table[key]
+
+    def make(self, cls, *args):
+        """Returns the (shared) node for cls applied to normalized children, after rewriting"""
+        res = self.rewrite(cls, args)
+        if res is not None:
+            self.rewrites += 1
+            return res
+        return self.node(cls, args)
+
+    def rewrite(self, cls, args):
+        """Returns the rewritten node or None when no rule applies"""
+        if cls == exp.NotOp:
+            r = args[0]
+            if type(r) == exp.NotOp and self.is_declarative(r.r):
+                return r.r
+            return None
+
+        if cls == exp.WhetherOp:
+            r = args[0]
+            if type(r) == exp.WhetherOp:
+                return r
+            if type(r) == exp.NotOp and self.is_declarative(r.r):
+                return self.make(exp.WhetherOp, r.r)
+            return None
+
+        if cls == exp.ModelsOp:
+            l, r = args
+            if type(l) == exp.ContextExp and type(r) == exp.AndOp:
+                return self.make(exp.AndOp, self.make(exp.ModelsOp, l, r.l), self.make(exp.ModelsOp, l, r.r))
+            return None
+
+        if cls == exp.ThenOp:
+            l, r = args
+            if self.is_declarative(l) and self.is_declarative(r):
+                return self.make(exp.OrOp, self.make(exp.NotOp, l), r)
+            if self.is_declarative(l) and type(r) == exp.InqOrOp:
+                return self.make(exp.InqOrOp, self.make(exp.ThenOp, l, r.l), self.make(exp.ThenOp, l, r.r))
+            if self.is_declarative(l) and type(r) == exp.WhetherOp:
+                return self.make(exp.InqOrOp, self.make(exp.ThenOp, l, r.r), self.make(exp.ThenOp, l, self.make(exp.NotOp, r.r)))
+            return None
+
+        if not cls in (exp.AndOp, exp.InqOrOp, exp.OrOp):
+            return None
+
+        l, r = args
+        if l is r and (cls != exp.OrOp or self.is_declarative(l)):
+            return l
+
+        for a, b in ((l, r), (r, l)):
+            if cls == exp.AndOp and type(b) in (exp.InqOrOp, exp.OrOp) and (b.l is a or b.r is a):
+                return a
+            if cls == exp.InqOrOp and type(b) == exp.AndOp and (b.l is a or b.r is a):
+                return a
+            if cls == exp.OrOp and type(b) in (exp.InqOrOp, exp.OrOp) and (b.l is a or b.r is a):
+                return self.make(exp.OrOp, b.l, b.r)
+
+        if cls == exp.OrOp:
+            if type(l) == exp.NotOp and type(l.r) == exp.NotOp:
+                return self.make(exp.OrOp, l.r.r, r)
+            if type(r) == exp.NotOp and type(r.r) == exp.NotOp:
+                return self.make(exp.OrOp, l, r.r.r)
+
+        return None
+
+    def rebuild(self, tree):
+        """Rebuilds the tree in post-order with an explicit stack (deep formulas do not hit the recursion limit)"""
+        done = dict()
+        stack = [tree]
+        while len(stack) > 0:
+            node = stack[-1]
+            pending = [c for c in children(node) if id(c) not in done]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+
+            if isinstance(node, exp.VariableExp):
+                done[id(node)] = self.leaf(node)
+            else:
+                done[id(node)] = self.make(type(node), *[done[id(c)] for c in children(node)])
+
+        return done[id(tree)]
+
+
+def optimize(tree):
+    """
+        Rewrites the formula into an equivalent one that is cheaper to evaluate.
+        Returns the new formula and the number of nodes removed.
+
+        Note: rewriting implications with a declarative antecedent and pushing "C models" into a conjunction add
+            nodes (they are cheaper to evaluate nonetheless), so the number of removed nodes can be negative.
+    """
+    if not isinstance(tree, exp.Expression):
+        return tree, 0
+
+    res = Optimizer().rebuild(tree)
+    return res, size(tree) - size(res)
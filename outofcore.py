@@ -0,0 +1,350 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import heapq
+import os
+import tempfile
+
+import expressions as exp
+import func as fn
+import iterative
+from optimizer import children
+
+
+# Out-of-core evaluation for propositions that do not fit in memory.
+#
+# Information states are bitmasks over the bit indices of the worlds of the model. A proposition is a run: its states as
+# fixed width big-endian integers in increasing order, kept in a list while it is small and spilled to a file on local
+# disk once it exceeds the memory ceiling. Every operation reads its arguments as sorted streams and writes a sorted run
+# (union and intersection are merges, powersets are generated in increasing order), so at most a buffer of every run is
+# in memory at a time. Intermediate runs are deleted as soon as their parent has been computed.
+
+DEFAULT_MEMORY = 64 * 1024 * 1024
+
+class Run():
+    """Sorted sequence of bitmasks, in memory up to limit masks and in a temporary file beyond that"""
+    def __init__(self, width, limit, directory=None):
+        self.width = width
+        self.limit = max(1, limit)
+        self.directory = directory
+        self.buffer = []
+        self.path = None
+        self.file = None
+        self.count = 0
+
+    def append(self, mask):
+        self.buffer.append(mask)
+        self.count += 1
+        if len(self.buffer) >= self.limit:
+            self.spill()
+
+    def spill(self):
+        if self.file is None:
+            handle, self.path = tempfile.mkstemp(prefix="inquisitive-", suffix=".run", dir=self.directory)
+            self.file = os.fdopen(handle, "wb")
+        self.file.write(b"".join([mask.to_bytes(self.width, "big") for mask in self.buffer]))
+        self.buffer = []
+
+    def finish(self):
+        """Ends writing, the run can be read (more than once) afterwards"""
+        if self.file is not None:
+            self.spill()
+            self.file.close()
+            self.file = None
+        return self
+
+    def __iter__(self):
+        if self.path is None:
+            yield from self.buffer
+            return
+
+        chunk = self.limit * self.width
+        with open(self.path, "rb") as f:
+            while True:
+                data = f.read(chunk)
+                if len(data) == 0:
+                    return
+                for i in range(0, len(data), self.width):
+                    yield int.from_bytes(data[i:i + self.width], "big")
+
+    def __len__(self):
+        return self.count
+
+    def delete(self):
+        self.buffer = []
+        if self.file is not None:
+            # deleted while it was written (the evaluation failed)
+            self.file.close()
+            self.file = None
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+
+def contains(run, mask):
+    """Whether the mask is in the sorted run, which is only read up to the position of mask"""
+    for m in run:
+        if m >= mask:
+            return m == mask
+    return False
+
+def unique(stream):
+    """Drops repeated masks from a sorted stream"""
+    last = None
+    for mask in stream:
+        if mask != last:
+            yield mask
+            last = mask
+
+def union(a, b):
+    return unique(heapq.merge(a, b))
+
+def intersection(a, b):
+    a, b = iter(a), iter(b)
+    x, y = next(a, None), next(b, None)
+    while x is not None and y is not None:
+        if x < y:
+            x = next(a, None)
+        elif y < x:
+            y = next(b, None)
+        else:
+            yield x
+            x, y = next(a, None), next(b, None)
+
+def difference(a, b):
+    b = iter(b)
+    y = next(b, None)
+    for x in a:
+        while y is not None and y < x:
+            y = next(b, None)
+        if x != y:
+            yield x
+
+def closure(masks):
+    """The downward closure of the masks as a sorted stream (submasks are generated in increasing order)"""
+    return unique(heapq.merge(*[fn.submasks(a) for a in fn.maximal_masks(masks)]))
+
+def info(run):
+    res = 0
+    for mask in run:
+        res |= mask
+    return res
+
+
+class DiskProposition():
+    """
+        Result of an out-of-core evaluation: iterating it yields the information states (frozensets of worlds) one at a time.
+        The run on disk is deleted by close (or at the end of a with statement).
+    """
+    def __init__(self, run, model):
+        self.run = run
+        self.model = model
+
+    def __iter__(self):
+        for mask in self.run:
+            yield self.model.from_mask(mask)
+
+    def masks(self):
+        return iter(self.run)
+
+    def __len__(self):
+        return len(self.run)
+
+    def __contains__(self, state):
+        if not all([w in self.model._world_index for w in state]):
+            return False
+        return contains(self.run, self.model.to_mask(state))
+
+    def close(self):
+        self.run.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __str__(self):
+        return "proposition with " + str(len(self)) + " states" + (" (stored in " + self.run.path + ")" if self.run.path else "")
+
+
+class Evaluator():
+    """Evaluates formulas like Expression.eval, with propositions as runs (see Run)"""
+    def __init__(self, model, memory=DEFAULT_MEMORY, directory=None):
+        self.model = model
+        self.width = max(1, (len(model._world_names) + 7) // 8)
+        # a buffered mask costs its int object and list slot on top of its encoding
+        self.limit = max(1, memory // (self.width + 64))
+        self.directory = directory
+        self.full = model.to_mask(model.worlds)
+        self.runs = [] # every run written so far, see close
+
+    def write(self, stream):
+        run = Run(self.width, self.limit, self.directory)
+        self.runs.append(run)
+        for mask in stream:
+            run.append(mask)
+        return run.finish()
+
+    def needed(self, node):
+        """The subformulas whose results node is computed from"""
+        if type(node) != exp.ModelsOp:
+            return children(node)
+        if type(node.l) == exp.InformationStateExp and type(node.r) not in (exp.ContextExp, exp.InformationStateExp, exp.ModelsOp):
+            # checked with the support checker, no proposition is needed (unless it is nested too deeply for it)
+            return [node.r] if iterative.depth(node.r) > iterative.RECURSIVE_MAX_DEPTH else []
+        if (type(node.l) == exp.InformationStateExp and type(node.r) == exp.ContextExp) or type(node.r) == exp.InformationStateExp:
+            return []
+        return [node.l, node.r]
+
+    def evaluate(self, tree):
+        """
+            Evaluates the formula with an explicit stack (in constant python stack, see iterative.py).
+            Every node is computed from the results of its subformulas, which are taken from the top of the value stack.
+        """
+        values = []
+        stack = [(tree, 0)]
+        while len(stack) > 0:
+            node, stage = stack.pop()
+            kids = self.needed(node)
+            if stage == 1 and type(node) == exp.AndOp and (type(values[-1]) == bool or type(values[-1]) == str):
+                # conjunction of models checks, short-circuits on the first failure
+                if values[-1] is True:
+                    values.pop()
+                    stack.append((node.r, 0))
+                continue
+            if stage < len(kids):
+                stack.append((node, stage + 1))
+                stack.append((kids[stage], 0))
+                continue
+            args = values[len(values) - len(kids):]
+            del values[len(values) - len(kids):]
+            values.append(self.apply(node, *args))
+        return values[0]
+
+    def apply(self, node, *args):
+        """The result of node from the results of its subformulas (see needed)"""
+        t = type(node)
+        if t == exp.PropExp:
+            return self.write(fn.submasks(self.model.to_mask([w for w in self.model.valuation.get(node.name, set()) if w in self.model._world_index])))
+        if t == exp.ContextExp:
+            return self.write(closure(self.model.context_masks()))
+        if t == exp.InformationStateExp:
+            return node.eval(self.model)
+        if t == exp.ModelsOp:
+            return self.models(node, *args)
+
+        if t in (exp.NotOp, exp.WhetherOp):
+            r = args[0]
+            complement = fn.submasks(self.full & ~info(r))
+            res = self.write(complement if t == exp.NotOp else union(r, complement))
+            r.delete()
+            return res
+
+        if t == exp.ThenOp:
+            return self.implication(*args)
+
+        l, r = args
+        if t == exp.AndOp:
+            res = self.write(intersection(l, r))
+        elif t == exp.InqOrOp:
+            res = self.write(union(l, r))
+        else:
+            res = self.write(fn.submasks(info(l) | info(r)))
+        l.delete()
+        r.delete()
+        return res
+
+    def implication(self, l, r):
+        """
+            A state supports the implication iff none of its substates supports the antecedent and not the consequent.
+            The minimal such (bad) states are collected from the sorted stream of bad states (substates come first),
+            then all states without a bad substate are written.
+
+            Note: the antichain of minimal bad states is kept in memory, it is usually much smaller than the propositions.
+        """
+        bad = []
+        for mask in difference(l, r):
+            if all([(b & ~mask) != 0 for b in bad]):
+                bad.append(mask)
+        l.delete()
+        r.delete()
+
+        return self.write(s for s in fn.submasks(self.full) if all([(b & ~s) != 0 for b in bad]))
+
+    def member(self, state, run):
+        """Whether the information state is in the run"""
+        mask = self.model.to_mask([w for w in state if w in self.model._world_index])
+        return len(state) == bin(mask).count("1") and contains(run, mask)
+
+    def models(self, node, *args):
+        if type(node.l) == exp.InformationStateExp and type(node.r) not in (exp.ContextExp, exp.InformationStateExp, exp.ModelsOp):
+            if len(args) == 0:
+                # checked with the support checker, no proposition is needed
+                return node.eval(self.model)
+            # too deep for the support checker, the state is looked up in the proposition of the right hand side
+            res = self.member(node.l.eval(self.model), args[0])
+            args[0].delete()
+            return res
+        if len(args) == 0:
+            return "syntax error"
+
+        l, r = args
+        if type(r) != Run:
+            if type(l) == Run:
+                l.delete()
+            return "syntax error"
+        if type(l) == frozenset:
+            res = self.member(l, r)
+        else:
+            res = next(iter(difference(l, r)), None) is None
+            l.delete()
+        r.delete()
+        return res
+
+    def close(self, keep=None):
+        """Deletes every run written by the evaluator (the intermediate results) except keep"""
+        for run in self.runs:
+            if run is not keep:
+                run.delete()
+        self.runs = [keep] if keep is not None else []
+
+
+def evaluate(formula, model, memory=DEFAULT_MEMORY, directory=None):
+    """
+        Evaluates the formula out of core, with at most about memory bytes of states in memory per run.
+        Returns a DiskProposition for sentences and the truth value (or "syntax error") for |= expressions.
+        The temporary files of the intermediate runs are deleted, also when the evaluation fails.
+    """
+    evaluator = Evaluator(model, memory, directory)
+    res = None
+    try:
+        res = evaluator.evaluate(formula)
+    finally:
+        evaluator.close(res if type(res) == Run else None)
+    if type(res) == Run:
+        return DiskProposition(res, model)
+    return res
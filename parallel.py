@@ -0,0 +1,194 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import contextlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import expressions as exp
+import func as fn
+import shared
+
+
+# Evaluation of a single implication on a pool of worker processes.
+#
+# Information states are bitmasks over the (sorted) worlds. The state lattice is split into chunks by fixing the
+# top bits of the masks, the choice functions of the alternative implementation by fixing a prefix of the choices.
+# Every chunk returns an antichain, the antichains of all chunks are merged by reducing them to their maximal elements.
+# All implications of one evaluation share one pool of workers (see Session and expressions.worker_pool).
+
+# the worker processes attach to the model in shared memory once, when they are started (see shared.init_worker)
+_model = None
+_names = None
+
+def init_worker(name, names):
+    global _model, _names
+    _model, _names = shared.init_worker(name), names
+
+
+class Session():
+    """The model published in shared memory and a pool of workers attached to it, both are started on first use"""
+    def __init__(self, model, workers):
+        self.model = model
+        self.workers = workers
+        self.names = sorted(model.worlds, key=str)
+        self.published = None
+        self.pool = None
+
+    def map(self, function, *iterables):
+        if self.pool is None:
+            self.published = shared.SharedModel(self.model)
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.published.name, self.names))
+        return self.pool.map(function, *iterables)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.published.close()
+        self.pool, self.published = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+@contextlib.contextmanager
+def session(model, workers):
+    """The Session of the evaluation in progress (see expressions.worker_pool) when it is on model, otherwise a new one"""
+    current = exp.current_pool()
+    if current is not None and current.model is model and current.workers == workers:
+        yield current
+        return
+    with Session(model, workers) as res:
+        yield res
+
+def state(mask):
+    return frozenset([_names[i] for i in fn.bits(mask)])
+
+def chunk_bits(n, workers):
+    """Number of top bits to fix such that there are about four chunks per worker"""
+    k = 0
+    while (1 << k) < 4 * workers and k < n:
+        k += 1
+    return k
+
+def low_subsets(low):
+    """Immediate subsets of a mask (one bit less)"""
+    return [low ^ (1 << i) for i in fn.bits(low)]
+
+def minimal_bad(node, top, k, n):
+    """
+        Returns the states of the chunk that support the antecedent but not the consequent and have no such proper substate in the chunk.
+        States with such a substate are skipped without checking them, they fail the implication regardless.
+    """
+    L = n - k
+    memo = dict()
+    has_bad = bytearray(1 << L)
+    res = []
+    for low in range(1 << L):
+        if any([has_bad[sub] for sub in low_subsets(low)]):
+            has_bad[low] = 1
+            continue
+
+        s = state((top << L) | low)
+        if exp.supports(_model, s, node.l, memo) and not exp.supports(_model, s, node.r, memo):
+            has_bad[low] = 1
+            res.append((top << L) | low)
+    return res
+
+def maximal_good(top, k, n, bad):
+    """Returns the maximal states of the chunk without a substate in bad"""
+    L = n - k
+    low_mask = (1 << L) - 1
+    good = bytearray(b"\x01") * (1 << L)
+    for b in bad:
+        if ((b >> L) & ~top) == 0:
+            good[b & low_mask] = 0
+
+    for low in range(1 << L):
+        if good[low] and not all([good[sub] for sub in low_subsets(low)]):
+            good[low] = 0
+
+    return [(top << L) | low for low in range(1 << L)
+            if good[low] and not any([good[low | (1 << i)] for i in fn.bits(low_mask & ~low)])]
+
+def then_eval(node, model, workers):
+    """Computes ThenOp.eval on a pool of workers (same result, the lattice of states is swept in chunks)"""
+    names = sorted(model.worlds, key=str)
+    n = len(names)
+    k = chunk_bits(n, workers)
+    full = (1 << n) - 1
+
+    with session(model, workers) as pool:
+        chunks = range(1 << k)
+        bad = list(itertools.chain.from_iterable(pool.map(minimal_bad, [node] * len(chunks), chunks, [k] * len(chunks), [n] * len(chunks))))
+
+        # only the minimal failing states matter, reduce them like an antichain (of complements)
+        bad = [full ^ b for b in fn.maximal_masks([full ^ b for b in bad])]
+
+        maxima = pool.map(maximal_good, chunks, [k] * len(chunks), [n] * len(chunks), [bad] * len(chunks))
+        maxima = fn.maximal_masks(itertools.chain.from_iterable(maxima))
+
+    return set([frozenset([names[i] for i in fn.bits(s)]) for a in maxima for s in fn.submasks(a)])
+
+def choices(prefix, leval, reval):
+    """Returns the maximal information states of all choice functions starting with prefix (alternative implementation)"""
+    complements, full = leval
+    infs = set()
+    for rest in itertools.product(reval, repeat=len(complements) - len(prefix)):
+        inf = full
+        for complement, choice in zip(complements, prefix + rest):
+            inf &= complement | choice
+        infs.add(inf)
+    return fn.maximal_masks(infs)
+
+def then_eval_alt(model, workers, leval, reval):
+    """
+        Computes ThenOp.eval_alt from the alternatives of the antecedent and the consequent on a pool of workers,
+        splitting the choice functions by a prefix of their choices
+    """
+    names = sorted(model.worlds, key=str)
+    index = dict([(w, i) for i, w in enumerate(names)])
+    full = (1 << len(names)) - 1
+
+    def mask(s):
+        return sum([1 << index[w] for w in s if w in index])
+
+    reval = [mask(a) for a in reval]
+    leval = [mask(a) for a in leval]
+
+    j = 0
+    while len(reval) ** j < 4 * workers and j < len(leval):
+        j += 1
+    prefixes = list(itertools.product(reval, repeat=j))
+
+    with session(model, workers) as pool:
+        complements = ([full & ~a for a in leval], full)
+        res = pool.map(choices, prefixes, [complements] * len(prefixes), [reval] * len(prefixes))
+        maxima = fn.maximal_masks(itertools.chain.from_iterable(res))
+
+    return set([frozenset([names[i] for i in fn.bits(a)]) for a in maxima])
@@ -0,0 +1,383 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+import expressions as exp
+import func as fn
+import iterative
+from optimizer import children, post_order
+
+
+# Cost based choice between the two representations of propositions, per node of a formula:
+#   "eval": the full proposition (all supporting information states), see Expression.eval
+#   "alt":  only the alternatives (maximal supporting states), see Expression.eval_alt
+# Costs are estimated from the number of worlds, the number of context alternatives and estimates of the informative
+# content and the number of alternatives of every subformula, scaled by per-operator constants measured by calibrate().
+# A node may use another representation than its subformulas, their results are converted when that pays off.
+
+MODES = {"eval": "eval", "alt": "eval_alt"}
+STRATEGIES = ("eval", "alt")
+
+# seconds per unit of estimated work, per operator and strategy (running python planner.py measures them, see its --cases,
+# --seed, --worlds and --out options)
+DEFAULT_STATISTICS = {
+    "PropExp": {"eval": 3.8e-6, "alt": 2.0e-6},
+    "ContextExp": {"eval": 3.5e-6, "alt": 2.2e-6},
+    "InformationStateExp": {"eval": 6.7e-6, "alt": 5.0e-6},
+    "NotOp": {"eval": 8.5e-7, "alt": 1.7e-6},
+    "WhetherOp": {"eval": 6.5e-7, "alt": 4.8e-6},
+    "AndOp": {"eval": 7.9e-7, "alt": 1.2e-5},
+    "InqOrOp": {"eval": 8.8e-7, "alt": 6.6e-6},
+    "OrOp": {"eval": 5.4e-7, "alt": 1.0e-6},
+    "ThenOp": {"eval": 1.6e-6, "alt": 6.4e-6},
+    "ModelsOp": {"eval": 6.1e-7, "alt": 1.2e-6},
+    "convert": {"eval": 1.4e-6, "alt": 2.8e-7},  # to the given representation
+}
+
+# measured constants are read from this file in the user cache directory when it exists (or from INQUISITIVE_PLANNER_STATS)
+STATISTICS_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                               "inquisitive_logic", "planner_stats.json")
+_statistics = None
+
+def statistics():
+    global _statistics
+    if _statistics is None:
+        _statistics = json.loads(json.dumps(DEFAULT_STATISTICS))
+        location = os.environ.get("INQUISITIVE_PLANNER_STATS", STATISTICS_FILE)
+        if os.path.exists(location):
+            with open(location, "r") as f:
+                for name, constants in json.load(f).items():
+                    _statistics.setdefault(name, dict()).update(constants)
+    return _statistics
+
+def set_statistics(stats):
+    global _statistics
+    _statistics = stats
+
+
+# estimates of work, as floats capped far below overflow
+CAP = 2.0 ** 1000
+
+def two(x):
+    return 2.0 ** min(x, 1000)
+
+def power(a, b):
+    if a <= 1:
+        return float(max(a, 0) if b > 0 else 1)
+    return CAP if b * math.log2(a) >= 1000 else float(a) ** b
+
+
+class Estimate():
+    """Estimated shape of the result of a node: size of the informative content, number of alternatives, number of nodes"""
+    def __init__(self, width, alternatives, size, boolean=False):
+        self.width = width
+        self.alternatives = alternatives
+        self.size = size
+        self.boolean = boolean
+
+def support_path(node):
+    """ModelsOp with an information state on the left is checked with the support checker (see ModelsOp.eval)"""
+    return type(node.l) == exp.InformationStateExp and type(node.r) not in (exp.ContextExp, exp.InformationStateExp, exp.ModelsOp)
+
+def needed(node, strategy):
+    """The subformulas whose results node uses when it is evaluated with strategy"""
+    if type(node) == exp.ThenOp and strategy == "eval":
+        return [] # swept with the support checker
+    if type(node) == exp.ModelsOp and support_path(node):
+        return []
+    return children(node)
+
+
+class Planner():
+    """
+        Estimates the cost of every strategy for every node of a formula on a model and picks the cheapest plan.
+    """
+    def __init__(self, model, stats=None):
+        self.model = model
+        self.stats = stats or statistics()
+        self.n = len(model.worlds)
+        self.c = len(model.context_masks())
+        self.estimates = dict()
+        self.best = dict()   # node -> {representation: (cost, strategy)}
+        self.own = dict()    # node -> {strategy: cost of the node itself}
+
+    def estimate(self, node):
+        n = self.n
+        kids = [self.estimates[c] for c in children(node)]
+        size = 1 + sum([k.size for k in kids])
+        t = type(node)
+
+        if t == exp.PropExp:
+            return Estimate(len(self.model.valuation.get(node.name, set())), 1, size)
+        if t == exp.ContextExp:
+            width = 0
+            for a in self.model.context_masks():
+                width |= a
+            return Estimate(bin(width).count("1"), self.c, size)
+        if t == exp.InformationStateExp:
+            state = node.informationState if node.informationState is not None else self.model.get_information_state(node.name)
+            return Estimate(len(state or ()), 1, size)
+        if t == exp.ModelsOp:
+            return Estimate(0, 1, size, True)
+        if t == exp.NotOp:
+            return Estimate(max(0, n - kids[0].width), 1, size)
+        if t in (exp.WhetherOp, exp.ThenOp):
+            r = kids[-1]
+            alternatives = r.alternatives + 1 if t == exp.WhetherOp else power(r.alternatives, kids[0].alternatives)
+            return Estimate(n, min(alternatives, two(n)), size)
+        l, r = kids
+        if t == exp.AndOp:
+            if l.boolean:
+                return Estimate(0, 1, size, True)
+            return Estimate(min(l.width, r.width), min(l.alternatives * r.alternatives, two(n)), size)
+        if t == exp.InqOrOp:
+            return Estimate(min(n, l.width + r.width), min(l.alternatives + r.alternatives, two(n)), size)
+        return Estimate(min(n, l.width + r.width), 1, size) # OrOp
+
+    def units(self, node, strategy):
+        """Estimated work of the node itself (its subformulas excluded) with strategy, before scaling"""
+        n = self.n
+        e = self.estimates[node]
+        kids = [self.estimates[c] for c in children(node)]
+        t = type(node)
+        alt = strategy == "alt"
+
+        if t == exp.PropExp:
+            return 1 + e.width if alt else two(e.width)
+        if t == exp.ContextExp:
+            return self.c * (1 + e.width) if alt else two(e.width)
+        if t == exp.InformationStateExp:
+            return 1
+        if t == exp.ModelsOp:
+            l, r = kids
+            if support_path(node):
+                return two(l.width) * r.size
+            return l.alternatives * r.alternatives * (1 + n) if alt else two(l.width) + two(r.width)
+        if t == exp.NotOp:
+            r = kids[0]
+            return r.alternatives * (1 + n) if alt else two(r.width) * (1 + r.width) + two(e.width)
+        if t == exp.WhetherOp:
+            r = kids[0]
+            return r.alternatives * (1 + n) + (r.alternatives + 1) ** 2 if alt else two(r.width) * (2 + r.width) + two(n)
+        if t == exp.ThenOp:
+            l, r = kids
+            if alt:
+                choices = power(r.alternatives, l.alternatives)
+                return choices * l.alternatives * (1 + n) + min(choices, e.alternatives) ** 2
+            return two(n) * (l.size + r.size)
+
+        l, r = kids
+        if t == exp.AndOp:
+            if l.boolean:
+                return 1
+            return l.alternatives * r.alternatives * (1 + l.alternatives * r.alternatives) if alt else two(l.width) + two(r.width)
+        if t == exp.InqOrOp:
+            return (l.alternatives + r.alternatives) ** 2 if alt else two(l.width) + two(r.width)
+        return (l.alternatives + r.alternatives) * (1 + n) if alt else (two(l.width) + two(r.width)) * (1 + e.width) + two(e.width)
+
+    def conversion(self, node, source, target):
+        """Estimated cost of converting the result of node from representation source to target"""
+        e = self.estimates[node]
+        if source == target or e.boolean:
+            return 0.0
+        if target == "alt":
+            # reducing a proposition to its alternatives compares all pairs of states
+            return self.stats["convert"]["alt"] * two(e.width) ** 2
+        return self.stats["convert"]["eval"] * e.alternatives * two(e.width)
+
+    def plan(self, tree, output="eval"):
+        """Returns the Plan of the cheapest evaluation of the formula, its result is given in representation output"""
+        for node in post_order(tree):
+            self.estimates[node] = self.estimate(node)
+            name = type(node).__name__
+            self.own[node] = dict()
+            self.best[node] = dict()
+            for strategy in STRATEGIES:
+                cost = self.stats[name][strategy] * self.units(node, strategy)
+                cost += sum([self.best[c][strategy][0] for c in needed(node, strategy)])
+                self.own[node][strategy] = min(cost, CAP)
+
+            for target in STRATEGIES:
+                if isinstance(node, exp.VariableExp):
+                    # leaves are produced directly in the representation that is asked for
+                    self.best[node][target] = (self.own[node][target], target)
+                    continue
+                self.best[node][target] = min([(self.own[node][s] + self.conversion(node, s, target), s) for s in STRATEGIES])
+
+        strategies = dict()
+        requested = dict()
+        stack = [(tree, output)]
+        while len(stack) > 0:
+            node, target = stack.pop()
+            requested.setdefault(node, set()).add(target)
+            if node in strategies:
+                continue
+            strategies[node] = self.best[node][target][1]
+            for c in needed(node, strategies[node]):
+                stack.append((c, strategies[node]))
+
+        return Plan(tree, output, strategies, requested, self)
+
+
+class Plan():
+    """The strategy of every evaluated node of a formula, see Planner.plan"""
+    def __init__(self, tree, output, strategies, requested, planner):
+        self.tree = tree
+        self.output = output
+        self.strategies = strategies
+        self.requested = requested
+        self.planner = planner
+
+    def cost(self):
+        return self.planner.best[self.tree][self.output][0]
+
+    def execute(self, model):
+        """Evaluates the formula following the plan, returns the result in the output representation"""
+        results = dict()
+        nodes = set(self.strategies.keys())
+        with exp.worker_pool(model):
+            for node in post_order(self.tree):
+                if node not in self.strategies:
+                    continue
+                strategy = self.strategies[node]
+                for c in needed(node, strategy):
+                    key = (c, MODES[strategy])
+                    # leaves are evaluated in every representation that is asked for (when the node asks for them)
+                    if key not in results and not isinstance(c, exp.VariableExp):
+                        results[key] = convert(results[(c, MODES[self.strategies[c]])], self.strategies[c], strategy)
+                with exp.stored_results(nodes, results):
+                    getattr(node, MODES[strategy])(model)
+
+        res = results[(self.tree, MODES[self.strategies[self.tree]])]
+        return convert(res, self.strategies[self.tree], self.output)
+
+    def explain(self):
+        """The plan as indented lines: the strategy and estimated cost of every node and the conversions between them"""
+        lines = ["estimated cost: %.3g s (%d worlds, %d context alternatives)" % (self.cost(), self.planner.n, self.planner.c)]
+        stack = [(self.tree, 0)]
+        while len(stack) > 0:
+            node, depth = stack.pop()
+            strategy = self.strategies[node]
+            conversions = sorted([r for r in self.requested[node] if r != strategy and not self.planner.estimates[node].boolean])
+            line = "  " * (depth + 1) + type(node).__name__ + " " + strategy + " (%.3g s)" % self.planner.own[node][strategy]
+            if isinstance(node, exp.VariableExp):
+                line += " " + str(node)
+            if len(conversions) > 0:
+                line += ", converted to " + ", ".join(conversions)
+            if len(needed(node, strategy)) < len(children(node)):
+                line += ", subformulas checked by support"
+            lines.append(line)
+            for c in reversed(needed(node, strategy)):
+                stack.append((c, depth + 1))
+        return "\n".join(lines)
+
+
+def convert(result, source, target):
+    """Converts a result between the representations, truth values (and errors) are returned as they are"""
+    if source == target or type(result) != set:
+        return result
+    if target == "alt":
+        return fn.alternatives(result)
+    return set([frozenset(s) for a in result for s in fn.set_powerset(a)])
+
+def calibrate(cases=200, seed=0, max_worlds=6, depth=3):
+    """
+        Measures the per-operator constants: the time of evaluating a node with the results of its subformulas given,
+        divided by the estimated units of work (median over random formulas and models, see fuzz.py).
+    """
+    import fuzz
+    rnd = random.Random(seed)
+    ones = dict([(name, {"eval": 1.0, "alt": 1.0}) for name in DEFAULT_STATISTICS])
+    ratios = dict()
+
+    def measure(name, strategy, function, units):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if 0 < units < CAP:
+            ratios.setdefault((name, strategy), []).append(elapsed / units)
+
+    for _ in range(cases):
+        tree, description = fuzz.random_case(rnd, max_worlds, depth)
+        model = fuzz.build(description)
+        planner = Planner(model, ones)
+        planner.plan(tree)
+
+        for node in post_order(tree):
+            for strategy in STRATEGIES:
+                mode = MODES[strategy]
+                kids = needed(node, strategy)
+                results = dict([((c, mode), getattr(c, mode)(model)) for c in kids])
+                def run():
+                    with exp.stored_results(set(kids), results):
+                        getattr(node, mode)(model)
+                measure(type(node).__name__, strategy, run, planner.units(node, strategy))
+
+            result = node.eval(model)
+            if type(result) == set:
+                alternatives = fn.alternatives(result)
+                measure("convert", "alt", lambda: convert(result, "eval", "alt"), planner.conversion(node, "eval", "alt"))
+                measure("convert", "eval", lambda: convert(alternatives, "alt", "eval"), planner.conversion(node, "alt", "eval"))
+
+    stats = json.loads(json.dumps(DEFAULT_STATISTICS))
+    for (name, strategy), values in ratios.items():
+        values.sort()
+        stats[name][strategy] = values[len(values) // 2]
+    return stats
+
+def plan(tree, model, output="eval"):
+    return Planner(model).plan(tree, output)
+
+def evaluate(tree, model, output="alt"):
+    """Evaluates the formula with the cheapest plan, the result is given as alternatives by default"""
+    if not isinstance(tree, exp.Expression):
+        return tree
+    if iterative.depth(tree) > iterative.RECURSIVE_MAX_DEPTH:
+        # the plan checks implications and support recursively (see needed)
+        return iterative.evaluate(tree, model, MODES[output])
+    return plan(tree, model, output).execute(model)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the per-operator constants of the cost model of the planner")
+    parser.add_argument("--cases", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worlds", type=int, default=6, help="maximum number of worlds of the random models")
+    parser.add_argument("--out", default=STATISTICS_FILE)
+    args = parser.parse_args()
+
+    exp.set_cache(None)
+    stats = calibrate(args.cases, args.seed, args.worlds)
+    for name, constants in sorted(stats.items()):
+        print("%-20s eval %9.3g  alt %9.3g" % (name, constants["eval"], constants["alt"]))
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(stats, f, indent=1)
@@ -0,0 +1,266 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import heapq
+
+try:
+    import pycosat # optional, a locally installed solver is much faster than the bundled one
+except ImportError:
+    pycosat = None
+
+
+# Small SAT solver for formulas in CNF. Clauses are lists of non-zero integers (DIMACS style literals).
+
+class Solver():
+    """
+        Bundled pure python CDCL solver (watched literals, first-UIP clause learning, activity based decisions and restarts).
+
+        Note: this is not meant to compete with real solvers, it is merely good enough for the (fairly structured) encodings of this project.
+    """
+    def __init__(self, nvars):
+        self.nvars = nvars
+        self.clauses = []
+        self.watches = dict()
+        self.units = []
+        self.unsat = False
+
+        self.assign = [0] * (nvars + 1) # 0: unassigned, 1: true, -1: false
+        self.level = [0] * (nvars + 1)
+        self.reason = [None] * (nvars + 1)
+        self.phase = [-1] * (nvars + 1)
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+
+        self.activity = [0.0] * (nvars + 1)
+        self.inc = 1.0
+        self.heap = [(0.0, v) for v in range(1, nvars + 1)]
+
+    def value(self, lit):
+        a = self.assign[abs(lit)]
+        return a if lit > 0 else -a
+
+    def add_clause(self, lits):
+        lits = list(dict.fromkeys(lits))
+        if any([-l in lits for l in lits]):
+            return # tautology
+
+        if len(lits) == 0:
+            self.unsat = True
+        elif len(lits) == 1:
+            self.units.append(lits[0])
+        else:
+            self.watch(lits)
+
+    def watch(self, clause):
+        self.clauses.append(clause)
+        self.watches.setdefault(clause[0], []).append(clause)
+        self.watches.setdefault(clause[1], []).append(clause)
+
+    def enqueue(self, lit, reason):
+        v = abs(lit)
+        self.assign[v] = 1 if lit > 0 else -1
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """Unit propagation, returns a conflicting clause or None"""
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+
+            watching = self.watches.get(false_lit, [])
+            kept = []
+            conflict = None
+            for i, clause in enumerate(watching):
+                if conflict is not None:
+                    kept.append(clause)
+                    continue
+
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+
+                if self.value(clause[0]) == 1:
+                    kept.append(clause)
+                    continue
+
+                # look for a new literal to watch
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) != -1:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if self.value(clause[0]) == -1:
+                        conflict = clause
+                    else:
+                        self.enqueue(clause[0], clause)
+
+            self.watches[false_lit] = kept
+            if conflict is not None:
+                return conflict
+
+        return None
+
+    def bump(self, v):
+        self.activity[v] += self.inc
+        if self.activity[v] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.inc *= 1e-100
+            self.heap = [(-self.activity[u], u) for u in range(1, self.nvars + 1) if self.assign[u] == 0]
+            heapq.heapify(self.heap)
+        else:
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+    def analyze(self, conflict):
+        """First-UIP conflict analysis, returns the learnt clause (asserting literal first) and the level to backjump to"""
+        current = len(self.trail_lim)
+        learnt = [None]
+        seen = set()
+        counter = 0
+        p = None
+        idx = len(self.trail) - 1
+        clause = conflict
+
+        while True:
+            for q in clause:
+                v = abs(q)
+                if p is not None and v == abs(p):
+                    continue
+                if v not in seen and self.level[v] > 0:
+                    seen.add(v)
+                    self.bump(v)
+                    if self.level[v] == current:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+
+            while abs(self.trail[idx]) not in seen:
+                idx -= 1
+            p = self.trail[idx]
+            idx -= 1
+            counter -= 1
+            if counter == 0:
+                break
+            clause = self.reason[abs(p)]
+
+        learnt[0] = -p
+        self.inc *= 1.05
+
+        if len(learnt) == 1:
+            return learnt, 0
+
+        # the literal with the highest level is watched next to the asserting literal
+        best = max(range(1, len(learnt)), key=lambda i: self.level[abs(learnt[i])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, self.level[abs(learnt[1])]
+
+    def backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        limit = self.trail_lim[level]
+        for lit in self.trail[limit:]:
+            v = abs(lit)
+            self.phase[v] = self.assign[v]
+            self.assign[v] = 0
+            self.reason[v] = None
+            heapq.heappush(self.heap, (-self.activity[v], v))
+        del self.trail[limit:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def decide(self):
+        while len(self.heap) > 0:
+            act, v = heapq.heappop(self.heap)
+            if self.assign[v] == 0 and -act == self.activity[v]:
+                self.trail_lim.append(len(self.trail))
+                self.enqueue(v if self.phase[v] == 1 else -v, None)
+                return True
+
+        # stale heap entries may hide unassigned variables
+        for v in range(1, self.nvars + 1):
+            if self.assign[v] == 0:
+                self.trail_lim.append(len(self.trail))
+                self.enqueue(v if self.phase[v] == 1 else -v, None)
+                return True
+        return False
+
+    def solve(self):
+        """Returns a list of true literals or None when the clauses are unsatisfiable"""
+        if self.unsat:
+            return None
+        for lit in self.units:
+            if self.value(lit) == -1:
+                return None
+            if self.value(lit) == 0:
+                self.enqueue(lit, None)
+
+        restart, conflicts = 1, 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if len(self.trail_lim) == 0:
+                    return None
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], None)
+                else:
+                    self.watch(learnt)
+                    self.enqueue(learnt[0], learnt)
+
+                conflicts += 1
+                if conflicts >= 100 * luby(restart):
+                    restart, conflicts = restart + 1, 0
+                    self.backtrack(0)
+            elif not self.decide():
+                return [v if self.assign[v] == 1 else -v for v in range(1, self.nvars + 1)]
+
+
+def luby(i):
+    """Returns the i-th element (starting at 1) of the Luby restart sequence 1 1 2 1 1 2 4 ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if (1 << k) - 1 == i:
+        return 1 << (k - 1)
+    return luby(i - (1 << (k - 1)) + 1)
+
+def solve(clauses, nvars):
+    """
+        Solves the clauses with pycosat when it is installed and with the bundled solver otherwise.
+        Returns a list of true literals or None when the clauses are unsatisfiable.
+    """
+    if pycosat is not None:
+        res = pycosat.solve(clauses, vars=nvars)
+        return None if res == "UNSAT" else res
+
+    solver = Solver(nvars)
+    for clause in clauses:
+        solver.add_clause(clause)
+    return solver.solve()
@@ -0,0 +1,180 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import json
+import struct
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import expressions as exp
+import func as fn
+from InquisitiveLogicModelChecker import Model, intern
+
+
+# Sharing a model with worker processes through shared memory, instead of pickling a copy for every worker.
+#
+# Layout of the block: the length of a json header (8 bytes), the header (world names in bit order, atoms, information
+# states and the width of a mask in bytes), then a bitmask per atom (the worlds where it is true) and the bitmasks of the
+# alternatives of the context. Workers attach read-only views whose valuation decodes the mask of an atom from the
+# shared buffer the first time the atom is used, so the valuation is never copied as a whole.
+
+HEADER = struct.Struct("<Q")
+
+class SharedModel():
+    """
+        A model published in a shared memory block. The block is freed by close (or at the end of a with statement),
+        worker processes attach to it by name.
+    """
+    def __init__(self, model):
+        names = list(model._world_names)
+        atoms = [atom for atom, worlds in model.valuation.items() if len(worlds) > 0]
+        width = max(1, (len(names) + 7) // 8)
+        header = json.dumps({"worlds": names, "atoms": atoms, "width": width,
+                             "alternatives": len(model._alternatives),
+                             "information_states": dict([(k, list(v)) for k, v in model.information_states.items()])}).encode()
+
+        start = HEADER.size + len(header)
+        self.size = start + width * (len(atoms) + len(model._alternatives))
+        self.block = shared_memory.SharedMemory(create=True, size=self.size)
+        self.name = self.block.name
+
+        buf = self.block.buf
+        buf[:HEADER.size] = HEADER.pack(len(header))
+        buf[HEADER.size:start] = header
+        masks = [model.to_mask([w for w in model.valuation[atom] if w in model._world_index]) for atom in atoms]
+        masks += list(model._alternatives)
+        for i, mask in enumerate(masks):
+            buf[start + i * width:start + (i + 1) * width] = mask.to_bytes(width, "little")
+
+    def close(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedValuation(Mapping):
+    """Read-only valuation of a model view, the worlds of an atom are decoded from the shared buffer on first use"""
+    def __init__(self, buf, offsets, width, names):
+        self.buf = buf
+        self.offsets = offsets
+        self.width = width
+        self.names = names
+        self.decoded = dict()
+
+    def __getitem__(self, atom):
+        # like the defaultdict of Model, unknown atoms are true nowhere
+        if atom not in self.decoded:
+            if atom not in self.offsets:
+                return frozenset()
+            i = self.offsets[atom]
+            mask = int.from_bytes(self.buf[i:i + self.width], "little")
+            self.decoded[atom] = frozenset([self.names[j] for j in fn.bits(mask)])
+        return self.decoded[atom]
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+class ModelView(Model):
+    """
+        Read-only model on top of a shared memory block (see attach), evaluation works like it does on a Model.
+
+        Note: the context may still be set or updated, that only changes the alternatives of this view. Every other change
+            goes through unshare, which refuses it.
+    """
+    __slots__ = ("_block",)
+
+    def unshare(self):
+        raise TypeError("a model view in shared memory is read-only, fork a Model instead")
+
+def attach(name):
+    """Returns a read-only view of the model published under name"""
+    # Note: worker processes share the resource tracker of the publishing process, which keeps the block until it is unlinked
+    block = shared_memory.SharedMemory(name=name)
+
+    buf = block.buf
+    length = HEADER.unpack(bytes(buf[:HEADER.size]))[0]
+    header = json.loads(bytes(buf[HEADER.size:HEADER.size + length]))
+    start = HEADER.size + length
+    width = header["width"]
+
+    names = [None if w is None else intern(w) for w in header["worlds"]]
+    offsets = dict([(intern(atom), start + i * width) for i, atom in enumerate(header["atoms"])])
+    start += width * len(offsets)
+
+    view = object.__new__(ModelView)
+    view._block = block
+    view._world_names = names
+    view._world_index = dict([(w, i) for i, w in enumerate(names) if w is not None])
+    view.worlds = set(view._world_index.keys())
+    view._free_bits = [i for i, w in enumerate(names) if w is None]
+    view._world_atoms = dict()
+    view.valuation = SharedValuation(buf, offsets, width, names)
+    view.information_states = dict([(k, tuple(v)) for k, v in header["information_states"].items()])
+    view._alternatives = [int.from_bytes(buf[start + i * width:start + (i + 1) * width], "little")
+                          for i in range(header["alternatives"])]
+    view._context = None
+    view._parent = None
+    view._depth = 0
+    view._shared = True
+    view._observers = list()
+    return view
+
+
+# the worker processes attach to the shared model once, when they are started
+_model = None
+
+def init_worker(name):
+    """Attaches the worker process to the model published under name, returns the view (see parallel.init_worker)"""
+    global _model
+    _model = attach(name)
+    exp.set_workers(1)
+    exp.set_cache(None)
+    return _model
+
+def evaluate(formula, mode):
+    return getattr(formula, mode)(_model)
+
+def evaluate_many(formulas, model, workers, mode="eval"):
+    """
+        Evaluates the formulas on a pool of workers that share one copy of the model (mode is "eval" or "eval_alt").
+        Returns the results in the order of the formulas.
+    """
+    formulas = list(formulas)
+    with SharedModel(model) as shared:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(shared.name,)) as pool:
+            return list(pool.map(evaluate, formulas, [mode] * len(formulas)))
@@ -0,0 +1,335 @@
+# License
+# MIT License
+#
+# Copyright (c) 2021 Korijn Moor
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Author
+# Korijn Moor
+
+import contextlib
+import sys
+
+import iterative
+
+
+# Symbolic representation of propositions as zero-suppressed decision diagrams (ZDDs).
+# A proposition is a (downward closed) family of information states, which is exactly what a ZDD encodes compactly.
+
+class ZDD():
+    """
+        Manager for ZDD nodes over a fixed ordering of the worlds of a model.
+
+        Nodes are plain integers indexing into self.nodes, every node is a tuple (level, lo, hi) where
+        lo is the family of states without the world at that level and hi the family of states with it (minus that world).
+        Node 0 is the empty family and node 1 is the family containing only the empty information state.
+
+        Note: nodes are shared through the unique table, so two nodes are equal if and only if their families are equal.
+    """
+    def __init__(self, worlds):
+        self.worlds = sorted(worlds)
+        self.levels = {w: i for i, w in enumerate(self.worlds)}
+        self.n = len(self.worlds)
+
+        self.nodes = [(self.n, 0, 0), (self.n, 1, 1)] # terminals have a level below every world
+        self.unique = dict()
+        self.cache = dict()
+        self.full = dict() # powersets of the worlds from a level downwards, used by the implication
+
+    def size(self):
+        """Number of entries in the node list, unique table and cache"""
+        return len(self.nodes) + len(self.unique) + len(self.cache)
+
+    @contextlib.contextmanager
+    def deep(self):
+        """
+            The recursive operations descend one level per call (the implication intersects at every level), within this
+            context the recursion limit allows that on large models. The previous limit is restored afterwards.
+        """
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 4 * self.n + 1000))
+        try:
+            yield self
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def node(self, level, lo, hi):
+        """Returns the (shared) node for the given level and children, applying the zero-suppression rule"""
+        if hi == 0:
+            return lo
+
+        key = (level, lo, hi)
+        u = self.unique.get(key)
+        if u is None:
+            u = len(self.nodes)
+            self.nodes.append(key)
+            self.unique[key] = u
+        return u
+
+    def level_of(self, states):
+        """Returns the sorted levels of the worlds in an information state, ignoring worlds outside the model"""
+        return sorted([self.levels[w] for w in states if w in self.levels])
+
+    def single(self, state):
+        """Family containing only the given information state"""
+        u = 1
+        for level in reversed(self.level_of(state)):
+            u = self.node(level, 0, u)
+        return u
+
+    def powerset(self, state):
+        """Family of all subsets of the given information state"""
+        u = 1
+        for level in reversed(self.level_of(state)):
+            u = self.node(level, u, u)
+        return u
+
+    def from_states(self, states):
+        """Family containing exactly the given information states"""
+        u = 0
+        for state in states:
+            u = self.union(u, self.single(state))
+        return u
+
+    def union(self, p, q):
+        if p == 0 or p == q:
+            return q
+        if q == 0:
+            return p
+
+        key = ("|", min(p, q), max(p, q))
+        if key in self.cache:
+            return self.cache[key]
+
+        vp, lp, hp = self.nodes[p]
+        vq, lq, hq = self.nodes[q]
+        if vp < vq:
+            u = self.node(vp, self.union(lp, q), hp)
+        elif vp > vq:
+            u = self.node(vq, self.union(p, lq), hq)
+        else:
+            u = self.node(vp, self.union(lp, lq), self.union(hp, hq))
+
+        self.cache[key] = u
+        return u
+
+    def intersection(self, p, q):
+        if p == 0 or q == 0:
+            return 0
+        if p == q:
+            return p
+
+        key = ("&", min(p, q), max(p, q))
+        if key in self.cache:
+            return self.cache[key]
+
+        vp, lp, hp = self.nodes[p]
+        vq, lq, hq = self.nodes[q]
+        if vp < vq:
+            u = self.intersection(lp, q)
+        elif vp > vq:
+            u = self.intersection(p, lq)
+        else:
+            u = self.node(vp, self.intersection(lp, lq), self.intersection(hp, hq))
+
+        self.cache[key] = u
+        return u
+
+    def difference(self, p, q):
+        if p == 0 or p == q:
+            return 0
+        if q == 0:
+            return p
+
+        key = ("-", p, q)
+        if key in self.cache:
+            return self.cache[key]
+
+        vp, lp, hp = self.nodes[p]
+        vq, lq, hq = self.nodes[q]
+        if vp < vq:
+            u = self.node(vp, self.difference(lp, q), hp)
+        elif vp > vq:
+            u = self.difference(p, lq)
+        else:
+            u = self.node(vp, self.difference(lp, lq), self.difference(hp, hq))
+
+        self.cache[key] = u
+        return u
+
+    def issubset(self, p, q):
+        return self.difference(p, q) == 0
+
+    def contains(self, u, state):
+        """Checks whether the information state is an element of the family"""
+        if any([w not in self.levels for w in state]):
+            return False
+
+        levels = self.level_of(state)
+        i = 0
+        while u > 1:
+            level, lo, hi = self.nodes[u]
+            if i < len(levels) and levels[i] == level:
+                u = hi
+                i += 1
+            elif i < len(levels) and levels[i] < level:
+                return False
+            else:
+                u = lo
+
+        return u == 1 and i == len(levels)
+
+    def support(self, u):
+        """
+            Returns the union of all information states in the family (the informative content).
+
+            Note: every non-terminal node of a reduced ZDD lies on a path to the terminal 1,
+            hence the support is simply the set of worlds of all reachable nodes.
+        """
+        seen = set()
+        stack = [u]
+        while len(stack) > 0:
+            v = stack.pop()
+            if v <= 1 or v in seen:
+                continue
+            seen.add(v)
+            stack.append(self.nodes[v][1])
+            stack.append(self.nodes[v][2])
+
+        return set([self.worlds[self.nodes[v][0]] for v in seen])
+
+    def powerset_from(self, level):
+        """Family of all subsets of the worlds at the given level and below"""
+        if level not in self.full:
+            u = 1
+            for l in range(self.n - 1, level - 1, -1):
+                u = self.node(l, u, u)
+                self.full[l] = u
+            self.full[self.n] = 1
+        return self.full[level]
+
+    def implication(self, p, q, level=0):
+        """
+            Returns the family of all states s such that every substate of s which is in p is also in q.
+
+            Explanation:
+                For the world w at the current level a state either does not contain w, then only the lo parts matter,
+                or it does contain w, then its substates without w must satisfy the lo parts and its substates with w the hi parts.
+        """
+        if p == 0 or p == q:
+            return self.powerset_from(level)
+        if level == self.n:
+            return 1 if q == 1 else 0
+
+        key = ("->", p, q, level)
+        if key in self.cache:
+            return self.cache[key]
+
+        vp, lp, hp = self.nodes[p]
+        vq, lq, hq = self.nodes[q]
+        p0, p1 = (lp, hp) if vp == level else (p, 0)
+        q0, q1 = (lq, hq) if vq == level else (q, 0)
+
+        lo = self.implication(p0, q0, level + 1)
+        hi = self.intersection(lo, self.implication(p1, q1, level + 1))
+        u = self.node(level, lo, hi)
+
+        self.cache[key] = u
+        return u
+
+    def count(self, u):
+        """Returns the number of information states in the family, without enumerating them"""
+        if u <= 1:
+            return u
+
+        key = ("#", u)
+        if key not in self.cache:
+            level, lo, hi = self.nodes[u]
+            self.cache[key] = self.count(lo) + self.count(hi)
+        return self.cache[key]
+
+    def maximal(self, u):
+        """
+            Returns the family of maximal states (the alternatives) of a downward closed family.
+
+            Explanation:
+                For a downward closed family hi is a subfamily of lo. The maximal states containing the world at this level are
+                the maximal states of hi (plus that world), the other maximal states are those of lo that cannot be extended by it.
+        """
+        if u <= 1:
+            return u
+
+        key = ("max", u)
+        if key not in self.cache:
+            level, lo, hi = self.nodes[u]
+            self.cache[key] = self.node(level, self.difference(self.maximal(lo), hi), self.maximal(hi))
+        return self.cache[key]
+
+    def to_proposition(self, u):
+        """Enumerates the family into the standard representation: a set of frozensets of worlds"""
+        if u == 0:
+            return set()
+        if u == 1:
+            return set([frozenset()])
+
+        level, lo, hi = self.nodes[u]
+        res = self.to_proposition(lo)
+        for state in self.to_proposition(hi):
+            res.add(state.union([self.worlds[level]]))
+        return res
+
+
+_manager = None
+
+# the shared manager is replaced by a new one before an evaluation when its tables hold more entries than this
+MAX_SIZE = 1000000
+
+def get_manager(model):
+    """
+        Returns a ZDD manager for the worlds of the model.
+        The last manager is reused as long as the worlds do not change and it holds at most MAX_SIZE entries, so that the
+        unique table and cache are shared between evaluations. Nodes must not be kept across evaluations.
+    """
+    global _manager
+    if _manager is None or _manager.worlds != sorted(model.worlds) or _manager.size() > MAX_SIZE:
+        _manager = ZDD(model.worlds)
+    return _manager
+
+def evaluate(formula, model):
+    """Evaluates the formula with the ZDD backend and returns the result in the standard representation"""
+    with get_manager(model).deep() as manager:
+        res = iterative.dispatch(formula, model, "eval_zdd", manager)
+        if type(res) == int:
+            res = manager.to_proposition(res)
+    return res
+
+def summary(formula, model, limit):
+    """
+        Evaluates the formula with the ZDD backend, the result is given in the standard representation when it has at most
+        limit states and otherwise by its numbers of states and alternatives (which are counted without enumerating them).
+    """
+    with get_manager(model).deep() as manager:
+        res = iterative.dispatch(formula, model, "eval_zdd", manager)
+        if type(res) != int:
+            return res
+        states = manager.count(res)
+        if states <= limit:
+            return manager.to_proposition(res)
+        return "%d states, %d alternatives (%d nodes)" % (states, manager.count(manager.maximal(res)), len(manager.nodes))